@@ -1,11 +1,23 @@
 # loi_finance_initiale_2025.py
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+import aiohttp
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook
 from datetime import datetime, timedelta
+from pathlib import Path
+import asyncio
+import hashlib
+import io
+import json
+import os
+import zipfile
 import time
 import random
 import warnings
@@ -80,6 +92,12 @@ st.markdown("""
         flex-wrap: wrap;
         gap: 1rem;
     }
+    .kpi-grid {
+        display: grid;
+        grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
+        gap: 1rem;
+        margin: 0.5rem 0;
+    }
     .kpi-card {
         flex: 1;
         min-width: 200px;
@@ -112,11 +130,118 @@ if 'inflation_data' not in st.session_state:
     st.session_state.inflation_data = {}
 if 'scenario_selected' not in st.session_state:
     st.session_state.scenario_selected = 'Base'
+if 'render_stats' not in st.session_state:
+    st.session_state.render_stats = {}
+
+# Sources macroéconomiques (miroirs internes INSEE / Eurostat / Banque de France)
+# L'URL de chaque miroir est lue dans LFI_MIRROR_INSEE, LFI_MIRROR_EUROSTAT, LFI_MIRROR_BDF
+# Forme attendue : 'scalaire' ({"valeur": nombre}) ou 'categories' ({"valeur": {catégorie: nombre}})
+MACRO_SOURCES = {
+    'inflation_prevue': {'miroir': 'bdf', 'chemin': '/projections/inflation', 'forme': 'scalaire'},
+    'croissance_pib': {'miroir': 'insee', 'chemin': '/comptes-nationaux/pib/croissance', 'forme': 'scalaire'},
+    'taux_chômage': {'miroir': 'insee', 'chemin': '/emploi/chomage/taux', 'forme': 'scalaire'},
+    'inflation_categories': {'miroir': 'eurostat', 'chemin': '/hicp/france/categories', 'forme': 'categories'}
+}
+SNAPSHOT_DIR = Path(os.environ.get('LFI_SNAPSHOT_DIR', Path(__file__).parent / 'snapshots'))
+
+def _nombre(valeur):
+    """Convertit un nombre fini (booléens, textes et NaN refusés)"""
+    if isinstance(valeur, bool) or not isinstance(valeur, (int, float)) or not np.isfinite(valeur):
+        raise ValueError(f"Valeur numérique attendue, reçu {valeur!r}")
+    return float(valeur)
+
+def _valider_source(contenu, forme):
+    """Valide la réponse d'une source selon sa forme attendue ('scalaire' ou 'categories')"""
+    valeur = contenu['valeur']
+    if forme == 'categories':
+        if not isinstance(valeur, dict) or not valeur:
+            raise ValueError(f"Dictionnaire {{catégorie: nombre}} attendu, reçu {valeur!r}")
+        return {str(cle): _nombre(v) for cle, v in valeur.items()}
+    return _nombre(valeur)
+
+def _lire_instantane(nom):
+    """Lit le dernier instantané valide d'une source (None si absent, illisible ou de forme inattendue)"""
+    try:
+        instantane = json.loads((SNAPSHOT_DIR / f'{nom}.json').read_text(encoding='utf-8'))
+        return {'valeur': _valider_source(instantane, MACRO_SOURCES[nom]['forme']),
+                'horodatage': instantane['horodatage']}
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def _ecrire_instantane(nom, valeur):
+    """Enregistre la dernière valeur valide d'une source (écriture atomique)"""
+    try:
+        SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+        temporaire = SNAPSHOT_DIR / f'{nom}.json.tmp'
+        temporaire.write_text(json.dumps({'valeur': valeur, 'horodatage': datetime.now().isoformat()},
+                                         ensure_ascii=False), encoding='utf-8')
+        os.replace(temporaire, SNAPSHOT_DIR / f'{nom}.json')
+    except OSError:
+        pass
+
+async def _fetch_macro_source(session, url, forme, timeout):
+    """Télécharge et valide une source (une réponse de forme inattendue lève ValueError)"""
+    async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as reponse:
+        reponse.raise_for_status()
+        contenu = await reponse.json(content_type=None)
+    if not isinstance(contenu, dict):
+        raise ValueError(f"Objet JSON attendu, reçu {contenu!r}")
+    return _valider_source(contenu, forme)
+
+async def _fetch_macro_sources(urls, timeout):
+    """Télécharge toutes les sources en parallèle sur un pool de connexions partagé"""
+    connecteur = aiohttp.TCPConnector(limit=20, limit_per_host=4)
+    async with aiohttp.ClientSession(connector=connecteur) as session:
+        resultats = await asyncio.gather(
+            *(_fetch_macro_source(session, url, MACRO_SOURCES[nom]['forme'], timeout) for nom, url in urls.items()),
+            return_exceptions=True
+        )
+    return dict(zip(urls.keys(), resultats))
+
+@st.cache_data(ttl=3600)
+def load_macro_inputs(timeout=5.0):
+    """Charge les hypothèses macroéconomiques, avec repli sur le dernier instantané local"""
+    debut = time.perf_counter()
+    
+    urls = {}
+    for nom, source in MACRO_SOURCES.items():
+        miroir = os.environ.get(f"LFI_MIRROR_{source['miroir'].upper()}")
+        if miroir:
+            urls[nom] = miroir.rstrip('/') + source['chemin']
+    
+    # Durée totale = source la plus lente (et au plus le délai d'expiration)
+    resultats = asyncio.run(_fetch_macro_sources(urls, timeout)) if urls else {}
+    
+    valeurs = {}
+    statuts = {}
+    for nom in MACRO_SOURCES:
+        resultat = resultats.get(nom)
+        if resultat is not None and not isinstance(resultat, BaseException):
+            valeurs[nom] = resultat
+            statuts[nom] = 'En direct'
+            _ecrire_instantane(nom, resultat)
+            continue
+        
+        instantane = _lire_instantane(nom)
+        if instantane is not None:
+            valeurs[nom] = instantane['valeur']
+            statuts[nom] = f"Instantané du {instantane['horodatage'][:10]}"
+        else:
+            statuts[nom] = 'Valeur par défaut'
+    
+    return {
+        'valeurs': valeurs,
+        'statuts': statuts,
+        'duree': time.perf_counter() - debut
+    }
 
 # Fonctions de données avec cache
 @st.cache_data(ttl=3600)
 def get_budget_data_2025():
     """Génère les données budgétaires détaillées pour 2025"""
+    # Hypothèses macroéconomiques issues des sources (valeurs par défaut sinon)
+    macro = load_macro_inputs()['valeurs']
+    
     # Données budgétaires de base pour 2025
     budget_2025 = {
         'recettes_totales': 525.3,  # Milliards d'euros
@@ -124,35 +249,35 @@ def get_budget_data_2025():
         'déficit': -52.9,
         'dette': 3215.8,
         'pib': 3125.5,
-        'inflation_prevue': 2.1,
-        'croissance_pib': 1.3,
-        'taux_chômage': 7.2
+        'inflation_prevue': macro.get('inflation_prevue', 2.1),
+        'croissance_pib': macro.get('croissance_pib', 1.3),
+        'taux_chômage': macro.get('taux_chômage', 7.2)
     }
     
     # Répartition détaillée des recettes
     recettes_detail = {
-        'Impôt sur le revenu': {'montant': 85.2, 'poids': 16.2, 'variation': 3.5},
-        'Impôt sur les sociétés': {'montant': 68.5, 'poids': 13.0, 'variation': 4.8},
-        'TVA': {'montant': 185.3, 'poids': 35.3, 'variation': 2.9},
-        'Taxes intérieures': {'montant': 42.8, 'poids': 8.1, 'variation': 1.2},
-        'Autres impôts': {'montant': 78.5, 'poids': 14.9, 'variation': 2.3},
-        'Recettes non fiscales': {'montant': 65.0, 'poids': 12.4, 'variation': 1.8}
+        'Impôt sur le revenu': {'code': 'R-IR', 'montant': 85.2},
+        'Impôt sur les sociétés': {'code': 'R-IS', 'montant': 68.5},
+        'TVA': {'code': 'R-TVA', 'montant': 185.3},
+        'Taxes intérieures': {'code': 'R-TI', 'montant': 42.8},
+        'Autres impôts': {'code': 'R-AI', 'montant': 78.5},
+        'Recettes non fiscales': {'code': 'R-RNF', 'montant': 65.0}
     }
     
     # Répartition détaillée des dépenses par mission
     depenses_missions = {
-        'Enseignement scolaire': {'montant': 75.2, 'poids': 13.0, 'variation': 2.1},
-        'Enseignement supérieur': {'montant': 32.8, 'poids': 5.7, 'variation': 3.5},
-        'Recherche': {'montant': 16.5, 'poids': 2.9, 'variation': 4.2},
-        'Santé': {'montant': 48.7, 'poids': 8.4, 'variation': 5.8},
-        'Solidarité': {'montant': 195.3, 'poids': 33.8, 'variation': 3.2},
-        'Défense': {'montant': 47.2, 'poids': 8.2, 'variation': 3.1},
-        'Sécurité': {'montant': 22.8, 'poids': 3.9, 'variation': 2.5},
-        'Justice': {'montant': 10.5, 'poids': 1.8, 'variation': 2.8},
-        'Écologie': {'montant': 35.6, 'poids': 6.2, 'variation': 8.5},
-        'Économie': {'montant': 28.4, 'poids': 4.9, 'variation': 1.5},
-        'Administration': {'montant': 15.2, 'poids': 2.6, 'variation': -0.5},
-        'Autres missions': {'montant': 50.0, 'poids': 8.7, 'variation': 1.2}
+        'Enseignement scolaire': {'code': 'M-ENS', 'montant': 75.2},
+        'Enseignement supérieur': {'code': 'M-SUP', 'montant': 32.8},
+        'Recherche': {'code': 'M-RECH', 'montant': 16.5},
+        'Santé': {'code': 'M-SANTE', 'montant': 48.7},
+        'Solidarité': {'code': 'M-SOLID', 'montant': 195.3},
+        'Défense': {'code': 'M-DEF', 'montant': 47.2},
+        'Sécurité': {'code': 'M-SECU', 'montant': 22.8},
+        'Justice': {'code': 'M-JUST', 'montant': 10.5},
+        'Écologie': {'code': 'M-ECOL', 'montant': 35.6},
+        'Économie': {'code': 'M-ECO', 'montant': 28.4},
+        'Administration': {'code': 'M-ADM', 'montant': 15.2},
+        'Autres missions': {'code': 'M-AUT', 'montant': 50.0}
     }
     
     # Données historiques pour projections
@@ -177,6 +302,419 @@ def get_budget_data_2025():
         }
     }
 
+@st.cache_data(ttl=3600)
+def get_budget_vintages():
+    """Charge les millésimes budgétaires (PLF, LFI, LFR) par code de nomenclature"""
+    budget_data = get_budget_data_2025()
+    
+    # Nomenclature stable : code -> libellé et nature de la ligne
+    nomenclature = {}
+    for nature, lignes in (('Recettes', budget_data['recettes_detail']),
+                           ('Dépenses', budget_data['depenses_missions'])):
+        for libelle, data in lignes.items():
+            nomenclature[data['code']] = {'Libellé': libelle, 'Nature': nature}
+    
+    # LFI 2025 : issue des données détaillées du budget
+    lfi_2025 = {data['code']: data['montant']
+                for lignes in (budget_data['recettes_detail'], budget_data['depenses_missions'])
+                for data in lignes.values()}
+    
+    # LFI 2024 : loi initiale de l'année précédente
+    lfi_2024 = {
+        'R-IR': 82.32, 'R-IS': 65.36, 'R-TVA': 180.08, 'R-TI': 42.29, 'R-AI': 76.74, 'R-RNF': 63.85,
+        'M-ENS': 73.65, 'M-SUP': 31.69, 'M-RECH': 15.83, 'M-SANTE': 46.03, 'M-SOLID': 189.24,
+        'M-DEF': 45.78, 'M-SECU': 22.24, 'M-JUST': 10.21, 'M-ECOL': 32.81, 'M-ECO': 27.98,
+        'M-ADM': 15.28, 'M-AUT': 49.41
+    }
+    
+    # LFR 2024 : loi rectificative (moins-values fiscales et annulations de crédits)
+    lfr_2024 = {**lfi_2024, 'R-IS': 61.9, 'R-TVA': 178.2, 'M-ECOL': 30.6, 'M-DEF': 46.3, 'M-RECH': 15.2}
+    
+    # PLF 2025 : projet initial, avant amendements parlementaires
+    plf_2025 = {**lfi_2025, 'R-IR': 84.6, 'R-IS': 70.1, 'M-DEF': 47.2, 'M-ECOL': 37.2, 'M-SANTE': 47.9,
+                'M-AUT': 51.3}
+    
+    millesimes = {
+        'LFI 2024': {'annee': 2024, 'type': 'LFI', 'montants': lfi_2024},
+        'LFR 2024': {'annee': 2024, 'type': 'LFR', 'montants': lfr_2024},
+        'PLF 2025': {'annee': 2025, 'type': 'PLF', 'montants': plf_2025},
+        'LFI 2025': {'annee': 2025, 'type': 'LFI', 'montants': lfi_2025}
+    }
+    
+    return {
+        'nomenclature': nomenclature,
+        'millesimes': millesimes
+    }
+
+@st.cache_data(ttl=3600)
+def build_vintage_table(vintages):
+    """Construit la table des millésimes indexée par (millésime, code)"""
+    montants = pd.concat(
+        {nom: pd.Series(millesime['montants'], dtype=float) for nom, millesime in vintages['millesimes'].items()},
+        names=['Millésime', 'Code']
+    )
+    # Index trié : l'extraction d'un millésime est une simple sélection de tranche
+    return montants.rename('Montant (Md€)').to_frame().sort_index()
+
+@st.cache_data(ttl=3600)
+def build_nomenclature_table(vintages):
+    """Construit la table de nomenclature indexée par code"""
+    nomenclature = pd.DataFrame.from_dict(vintages['nomenclature'], orient='index')
+    nomenclature.index.name = 'Code'
+    return nomenclature.sort_index()
+
+def vintage_columns(reference, cible):
+    """Libellés des colonnes de montants d'une comparaison (distincts même si reference == cible)"""
+    if reference == cible:
+        return f'{reference} - référence (Md€)', f'{cible} - comparé (Md€)'
+    return f'{reference} (Md€)', f'{cible} (Md€)'
+
+def compare_vintages(vintage_table, nomenclature_table, reference, cible):
+    """Compare deux millésimes ligne à ligne par jointure sur le code de nomenclature"""
+    montant_ref = vintage_table.loc[reference, 'Montant (Md€)'].rename('reference')
+    montant_cible = vintage_table.loc[cible, 'Montant (Md€)'].rename('cible')
+    
+    # Jointure externe sur l'index des codes (lignes créées ou supprimées incluses)
+    diff = pd.concat([montant_ref, montant_cible], axis=1, join='outer')
+    diff = nomenclature_table.join(diff, how='right')
+    
+    ecart = diff['cible'].fillna(0) - diff['reference'].fillna(0)
+    diff['Écart (Md€)'] = ecart
+    diff['Variation (%)'] = ecart / diff['reference'] * 100
+    diff['Statut'] = np.select(
+        [diff['reference'].isna(), diff['cible'].isna(), ecart.abs() > 1e-9],
+        ['Nouvelle ligne', 'Ligne supprimée', 'Modifiée'],
+        default='Inchangée'
+    )
+    diff.index.name = 'Code'
+    colonne_ref, colonne_cible = vintage_columns(reference, cible)
+    return diff.rename(columns={'reference': colonne_ref, 'cible': colonne_cible})
+
+class BudgetLines:
+    """Lignes budgétaires en représentation colonnaire.
+    
+    Chaque ligne est stockée comme un code entier vers la nomenclature (int8/16/32
+    selon la taille de la nomenclature), un code de nature (int8) et un montant
+    (float64 par défaut, float32 possible). Mesuré pour 1 million de lignes et
+    une nomenclature de 5 000 codes : 11 Mo en float64, 7 Mo en float32, contre
+    ~350 Mo pour le même contenu en dictionnaires imbriqués.
+    Les poids sont calculés à la demande ; les vues partagent la mémoire des
+    tableaux (aucune copie des codes ni des montants).
+    """
+    NATURES = ['Recettes', 'Dépenses']
+    
+    def __init__(self, codes, libelles, lignes, natures, montants):
+        self.codes = pd.Index(codes, name='Code')
+        self.libelles = pd.Index(libelles)
+        
+        # Type entier des codes identique à celui des Categorical pandas (pas de conversion à la lecture)
+        type_codes = np.int8 if len(self.codes) < 2**7 else np.int16 if len(self.codes) < 2**15 else np.int32
+        natures = np.asarray(natures, dtype=np.int8)
+        ordre = np.argsort(natures, kind='stable')
+        
+        # Lignes regroupées par nature : chaque nature est une tranche contiguë
+        self.natures = natures[ordre]
+        self.lignes = np.asarray(lignes, dtype=type_codes)[ordre]
+        self.montants = np.asarray(montants)[ordre]
+        bornes = np.searchsorted(self.natures, np.arange(len(self.NATURES) + 1))
+        self._tranches = {nature: slice(bornes[i], bornes[i + 1]) for i, nature in enumerate(self.NATURES)}
+    
+    @classmethod
+    def from_records(cls, budget_data, dtype=np.float64):
+        """Construit les colonnes à partir des dictionnaires de recettes et de missions"""
+        codes, libelles, natures, montants = [], [], [], []
+        for nature, lignes in enumerate((budget_data['recettes_detail'], budget_data['depenses_missions'])):
+            for libelle, data in lignes.items():
+                codes.append(data['code'])
+                libelles.append(libelle)
+                natures.append(nature)
+                montants.append(data['montant'])
+        return cls(codes, libelles, np.arange(len(codes)), natures, np.array(montants, dtype=dtype))
+    
+    @property
+    def nbytes(self):
+        """Mémoire occupée par les colonnes par ligne (hors nomenclature)"""
+        return self.lignes.nbytes + self.natures.nbytes + self.montants.nbytes
+    
+    def montants_nature(self, nature):
+        """Montants d'une nature (vue sur le tableau des montants)"""
+        return self.montants[self._tranches[nature]]
+    
+    def poids(self, nature):
+        """Poids de chaque ligne dans le total de sa nature (%)"""
+        montants = self.montants_nature(nature)
+        return montants / montants.sum() * 100
+    
+    def view(self, nature, colonne_libelle='Libellé'):
+        """DataFrame d'une nature, construit sans copie des codes ni des montants"""
+        lignes = self.lignes[self._tranches[nature]]
+        return pd.DataFrame({
+            'Code': pd.Categorical.from_codes(lignes, categories=self.codes, validate=False),
+            colonne_libelle: pd.Categorical.from_codes(lignes, categories=self.libelles, validate=False),
+            'Montant (Md€)': self.montants_nature(nature),
+            'Poids (%)': self.poids(nature)
+        }, copy=False)
+
+@st.cache_resource
+def get_budget_lines():
+    """Lignes budgétaires 2025 en représentation colonnaire (partagée, lecture seule)"""
+    return BudgetLines.from_records(get_budget_data_2025())
+
+def build_inflation_table(categories_inflation):
+    """Table d'inflation par catégorie (libellés catégoriels, colonnes numériques)"""
+    table = pd.DataFrame.from_dict(categories_inflation, orient='index', dtype=float)
+    table.index = pd.CategoricalIndex(table.index, name='Catégorie')
+    return table.rename(columns={
+        'actuel': 'Inflation Actuelle (%)',
+        'prevision_2025': 'Prévision 2025 (%)',
+        'impact_budget': 'Impact Budget (Md€)'
+    }).reset_index()
+
+@st.cache_data(ttl=3600)
+def get_local_authority_transfers():
+    """Concours financiers de l'État aux collectivités territoriales (Md€)"""
+    return {
+        'Dotation globale de fonctionnement (DGF)': 27.2,
+        'FCTVA': 7.1,
+        'Compensations d\'exonérations fiscales': 4.8,
+        'Mission Relations avec les collectivités territoriales': 3.9,
+        'Dotations d\'investissement (DETR, DSIL, DSID)': 2.0,
+        'Autres prélèvements sur recettes': 1.3
+    }
+
+@st.cache_data(ttl=3600)
+def get_territorial_reference():
+    """Référentiel des régions et départements (codes INSEE)"""
+    regions = {
+        '01': 'Guadeloupe', '02': 'Martinique', '03': 'Guyane', '04': 'La Réunion', '06': 'Mayotte',
+        '11': 'Île-de-France', '24': 'Centre-Val de Loire', '27': 'Bourgogne-Franche-Comté',
+        '28': 'Normandie', '32': 'Hauts-de-France', '44': 'Grand Est', '52': 'Pays de la Loire',
+        '53': 'Bretagne', '75': 'Nouvelle-Aquitaine', '76': 'Occitanie', '84': 'Auvergne-Rhône-Alpes',
+        '93': 'Provence-Alpes-Côte d\'Azur', '94': 'Corse'
+    }
+    
+    # Code département : (nom, code région)
+    departements = {
+        '01': ('Ain', '84'), '02': ('Aisne', '32'), '03': ('Allier', '84'),
+        '04': ('Alpes-de-Haute-Provence', '93'), '05': ('Hautes-Alpes', '93'), '06': ('Alpes-Maritimes', '93'),
+        '07': ('Ardèche', '84'), '08': ('Ardennes', '44'), '09': ('Ariège', '76'), '10': ('Aube', '44'),
+        '11': ('Aude', '76'), '12': ('Aveyron', '76'), '13': ('Bouches-du-Rhône', '93'), '14': ('Calvados', '28'),
+        '15': ('Cantal', '84'), '16': ('Charente', '75'), '17': ('Charente-Maritime', '75'), '18': ('Cher', '24'),
+        '19': ('Corrèze', '75'), '2A': ('Corse-du-Sud', '94'), '2B': ('Haute-Corse', '94'),
+        '21': ('Côte-d\'Or', '27'), '22': ('Côtes-d\'Armor', '53'), '23': ('Creuse', '75'),
+        '24': ('Dordogne', '75'), '25': ('Doubs', '27'), '26': ('Drôme', '84'), '27': ('Eure', '28'),
+        '28': ('Eure-et-Loir', '24'), '29': ('Finistère', '53'), '30': ('Gard', '76'),
+        '31': ('Haute-Garonne', '76'), '32': ('Gers', '76'), '33': ('Gironde', '75'), '34': ('Hérault', '76'),
+        '35': ('Ille-et-Vilaine', '53'), '36': ('Indre', '24'), '37': ('Indre-et-Loire', '24'),
+        '38': ('Isère', '84'), '39': ('Jura', '27'), '40': ('Landes', '75'), '41': ('Loir-et-Cher', '24'),
+        '42': ('Loire', '84'), '43': ('Haute-Loire', '84'), '44': ('Loire-Atlantique', '52'),
+        '45': ('Loiret', '24'), '46': ('Lot', '76'), '47': ('Lot-et-Garonne', '75'), '48': ('Lozère', '76'),
+        '49': ('Maine-et-Loire', '52'), '50': ('Manche', '28'), '51': ('Marne', '44'),
+        '52': ('Haute-Marne', '44'), '53': ('Mayenne', '52'), '54': ('Meurthe-et-Moselle', '44'),
+        '55': ('Meuse', '44'), '56': ('Morbihan', '53'), '57': ('Moselle', '44'), '58': ('Nièvre', '27'),
+        '59': ('Nord', '32'), '60': ('Oise', '32'), '61': ('Orne', '28'), '62': ('Pas-de-Calais', '32'),
+        '63': ('Puy-de-Dôme', '84'), '64': ('Pyrénées-Atlantiques', '75'), '65': ('Hautes-Pyrénées', '76'),
+        '66': ('Pyrénées-Orientales', '76'), '67': ('Bas-Rhin', '44'), '68': ('Haut-Rhin', '44'),
+        '69': ('Rhône', '84'), '70': ('Haute-Saône', '27'), '71': ('Saône-et-Loire', '27'),
+        '72': ('Sarthe', '52'), '73': ('Savoie', '84'), '74': ('Haute-Savoie', '84'), '75': ('Paris', '11'),
+        '76': ('Seine-Maritime', '28'), '77': ('Seine-et-Marne', '11'), '78': ('Yvelines', '11'),
+        '79': ('Deux-Sèvres', '75'), '80': ('Somme', '32'), '81': ('Tarn', '76'),
+        '82': ('Tarn-et-Garonne', '76'), '83': ('Var', '93'), '84': ('Vaucluse', '93'), '85': ('Vendée', '52'),
+        '86': ('Vienne', '75'), '87': ('Haute-Vienne', '75'), '88': ('Vosges', '44'), '89': ('Yonne', '27'),
+        '90': ('Territoire de Belfort', '27'), '91': ('Essonne', '11'), '92': ('Hauts-de-Seine', '11'),
+        '93': ('Seine-Saint-Denis', '11'), '94': ('Val-de-Marne', '11'), '95': ('Val-d\'Oise', '11'),
+        '971': ('Guadeloupe', '01'), '972': ('Martinique', '02'), '973': ('Guyane', '03'),
+        '974': ('La Réunion', '04'), '976': ('Mayotte', '06')
+    }
+    
+    # Nombre de communes connu pour les départements atypiques (sinon tiré aléatoirement)
+    nb_communes = {'75': 1, '92': 36, '93': 40, '94': 47, '971': 32, '972': 34, '973': 22, '974': 24, '976': 17}
+    
+    return {
+        'regions': regions,
+        'departements': departements,
+        'nb_communes': nb_communes
+    }
+
+def _normaliser_noms(noms):
+    """Normalise des noms pour la recherche (minuscules, sans accents)"""
+    return (pd.Series(noms, dtype=str).str.normalize('NFKD')
+            .str.encode('ascii', errors='ignore').str.decode('ascii').str.lower())
+
+@st.cache_resource
+def get_territorial_store(graine=2025):
+    """Table des ~35 000 communes (données illustratives), triée par code INSEE"""
+    reference = get_territorial_reference()
+    rng = np.random.default_rng(graine)
+    
+    # Nombre de communes par département
+    codes_dep = list(reference['departements'].keys())
+    tailles = rng.poisson(380, len(codes_dep))
+    tailles = np.array([reference['nb_communes'].get(dep, taille) for dep, taille in zip(codes_dep, tailles)])
+    dep_commune = np.repeat(codes_dep, tailles)
+    rang = np.concatenate([np.arange(1, taille + 1) for taille in tailles])
+    
+    # Code INSEE : département + numéro (3 chiffres en métropole, 2 outre-mer)
+    dep_series = pd.Series(dep_commune)
+    numero = pd.Series(rang).astype(str)
+    codes = dep_series + np.where(dep_series.str.len() == 3, numero.str.zfill(2), numero.str.zfill(3))
+    
+    # Noms de communes générés à partir de syllabes
+    n = len(codes)
+    prefixes = np.array(['', '', '', 'Saint-', 'Sainte-', 'Le ', 'La ', 'Les '])
+    racines = np.array(['Mont', 'Val', 'Beau', 'Ville', 'Château', 'Roche', 'Font', 'Bois', 'Pré', 'Mar',
+                        'Ber', 'Cor', 'Lan', 'Ker', 'Saint', 'Bel', 'Mor', 'Aub', 'Vil', 'Cha'])
+    finales = np.array(['ville', 'court', 'mont', 'fort', 'lieu', 'bourg', 'ac', 'an', 'eux', 'ières',
+                        'ois', 'erre', 'igny', 'ay', 'el', 'ard'])
+    suffixes = np.array(['', '', '', '', '', '-sur-Mer', '-sur-Loire', '-les-Bains', '-en-Vallée', '-le-Haut'])
+    noms = (pd.Series(prefixes[rng.integers(0, len(prefixes), n)])
+            + pd.Series(racines[rng.integers(0, len(racines), n)])
+            + pd.Series(finales[rng.integers(0, len(finales), n)])
+            + pd.Series(suffixes[rng.integers(0, len(suffixes), n)]))
+    
+    # Population et finances (montants en M€, ratios par habitant tirés autour de moyennes nationales)
+    population = np.maximum(rng.lognormal(np.log(800), 1.3, n).astype(int), 10)
+    paris = codes.to_numpy() == '75001'
+    noms[paris] = 'Paris'
+    population[paris] = 2_100_000
+    
+    def montant(moyenne_par_hab, ecart_type):
+        return np.maximum(rng.normal(moyenne_par_hab, ecart_type, n), 0) * population / 1e6
+    
+    dgf = montant(170, 40)
+    dgf *= 12.3e3 / dgf.sum()  # DGF du bloc communal : 12.3 Md€
+    
+    communes = pd.DataFrame({
+        'Code commune': codes,
+        'Commune': noms,
+        'Code département': dep_commune,
+        'Population': population,
+        'DGF (M€)': dgf,
+        'Autres dotations (M€)': montant(40, 15),
+        'Recettes fiscales (M€)': montant(650, 150),
+        'Dépenses de fonctionnement (M€)': montant(1000, 200),
+        'Dépenses d\'investissement (M€)': montant(380, 150),
+        'Encours de dette (M€)': montant(900, 400)
+    })
+    
+    # EPCI : regroupements contigus de 15 à 40 communes au sein d'un département
+    taille_epci = rng.integers(15, 41, len(tailles))
+    debut_dep = np.r_[0, np.cumsum(tailles)[:-1]]
+    position = np.arange(n) - np.repeat(debut_dep, tailles)
+    numero_epci = (position // np.repeat(taille_epci, tailles)) + 1
+    communes['Code EPCI'] = dep_series + '-' + pd.Series(numero_epci).astype(str).str.zfill(3)
+    
+    # Nom et nature de l'EPCI d'après sa commune la plus peuplée
+    centres = communes.loc[communes.groupby('Code EPCI')['Population'].idxmax(), ['Code EPCI', 'Commune']]
+    population_epci = communes.groupby('Code EPCI')['Population'].sum()
+    nature = pd.cut(population_epci, [0, 50_000, 400_000, np.inf], labels=['CC', 'CA', 'Métropole'])
+    noms_epci = nature.astype(str) + ' ' + centres.set_index('Code EPCI')['Commune']
+    communes['EPCI'] = communes['Code EPCI'].map(noms_epci)
+    
+    # Codes répétés stockés en catégories
+    for colonne in ('Code département', 'Code EPCI', 'EPCI'):
+        communes[colonne] = communes[colonne].astype('category')
+    
+    communes = communes.sort_values('Code commune', ignore_index=True)
+    return {
+        'communes': communes,
+        'codes': communes['Code commune'].to_numpy(dtype=str)
+    }
+
+def _plage_prefixe(cles_triees, prefixe):
+    """Plage [debut, fin) des clés triées commençant par le préfixe"""
+    debut = np.searchsorted(cles_triees, prefixe, side='left')
+    fin = np.searchsorted(cles_triees, prefixe + '\uffff', side='left')
+    return debut, fin
+
+def get_communes_departement(store, code_departement):
+    """Communes d'un département par recherche dichotomique sur le code INSEE trié"""
+    debut, fin = _plage_prefixe(store['codes'], code_departement)
+    return store['communes'].iloc[debut:fin]
+
+@st.cache_data(ttl=3600)
+def build_territorial_rollups():
+    """Agrégats pré-calculés commune -> EPCI -> département -> région"""
+    reference = get_territorial_reference()
+    communes = get_territorial_store()['communes']
+    montants = ['Population', 'DGF (M€)', 'Autres dotations (M€)', 'Recettes fiscales (M€)',
+                'Dépenses de fonctionnement (M€)', 'Dépenses d\'investissement (M€)', 'Encours de dette (M€)']
+    
+    # Chaque niveau est agrégé à partir du niveau inférieur
+    epci = communes.groupby('Code EPCI', observed=True).agg(
+        **{'EPCI': ('EPCI', 'first'), 'Code département': ('Code département', 'first'),
+           'Nombre de communes': ('Code commune', 'size')},
+        **{colonne: (colonne, 'sum') for colonne in montants}
+    )
+    epci['Code département'] = epci['Code département'].astype(str)
+    
+    departements = epci.groupby('Code département')[montants + ['Nombre de communes']].sum()
+    departements['Département'] = departements.index.map(lambda code: reference['departements'][code][0])
+    departements['Code région'] = departements.index.map(lambda code: reference['departements'][code][1])
+    
+    regions = departements.groupby('Code région')[montants + ['Nombre de communes']].sum()
+    regions['Région'] = regions.index.map(reference['regions'])
+    departements['Région'] = departements['Code région'].map(reference['regions'])
+    
+    # Ratios par habitant, prêts à être joints à un fond de carte par code INSEE
+    for niveau in (epci, departements, regions):
+        niveau['DGF par habitant (€)'] = niveau['DGF (M€)'] * 1e6 / niveau['Population']
+        niveau['Dotations par habitant (€)'] = (niveau['DGF (M€)'] + niveau['Autres dotations (M€)']) * 1e6 / niveau['Population']
+        niveau['Dette par habitant (€)'] = niveau['Encours de dette (M€)'] * 1e6 / niveau['Population']
+        niveau['Fonctionnement par habitant (€)'] = niveau['Dépenses de fonctionnement (M€)'] * 1e6 / niveau['Population']
+    
+    return {
+        'epci': epci,
+        'departements': departements,
+        'regions': regions
+    }
+
+@st.cache_resource
+def build_territorial_search_index():
+    """Index trié des noms et codes de toutes les collectivités pour la recherche par préfixe"""
+    communes = get_territorial_store()['communes']
+    rollups = build_territorial_rollups()
+    
+    entites = pd.concat([
+        pd.DataFrame({'Niveau': 'Commune', 'Code': communes['Code commune'], 'Nom': communes['Commune'],
+                      'Département': communes['Code département'].astype(str), 'Population': communes['Population']}),
+        pd.DataFrame({'Niveau': 'EPCI', 'Code': rollups['epci'].index, 'Nom': rollups['epci']['EPCI'].astype(str),
+                      'Département': rollups['epci']['Code département'], 'Population': rollups['epci']['Population']}),
+        pd.DataFrame({'Niveau': 'Département', 'Code': rollups['departements'].index,
+                      'Nom': rollups['departements']['Département'], 'Département': rollups['departements'].index,
+                      'Population': rollups['departements']['Population']}),
+        pd.DataFrame({'Niveau': 'Région', 'Code': rollups['regions'].index, 'Nom': rollups['regions']['Région'],
+                      'Département': '', 'Population': rollups['regions']['Population']})
+    ], ignore_index=True)
+    
+    noms = _normaliser_noms(entites['Nom']).to_numpy(dtype=str)
+    codes = entites['Code'].str.lower().to_numpy(dtype=str)
+    ordre_noms = np.argsort(noms, kind='stable')
+    ordre_codes = np.argsort(codes, kind='stable')
+    
+    return {
+        'entites': entites,
+        'noms': noms[ordre_noms],
+        'ordre_noms': ordre_noms,
+        'codes': codes[ordre_codes],
+        'ordre_codes': ordre_codes
+    }
+
+def search_territorial_entities(index, requete, limite=50):
+    """Recherche par préfixe de nom ou de code (recherche dichotomique sur l'index trié)"""
+    cle = _normaliser_noms([requete.strip()]).iloc[0]
+    if not cle:
+        return index['entites'].iloc[:0]
+    
+    debut, fin = _plage_prefixe(index['noms'], cle)
+    positions = index['ordre_noms'][debut:fin]
+    debut, fin = _plage_prefixe(index['codes'], cle)
+    positions = np.unique(np.concatenate([positions, index['ordre_codes'][debut:fin]]))
+    
+    # Les collectivités les plus peuplées d'abord
+    resultats = index['entites'].iloc[positions]
+    return resultats.nlargest(limite, 'Population')
+
 @st.cache_data(ttl=3600)
 def get_inflation_projections():
     """Génère les projections d'inflation détaillées"""
@@ -190,6 +728,12 @@ def get_inflation_projections():
         'Transports': {'actuel': 4.8, 'prevision_2025': 3.2, 'impact_budget': 12.5}
     }
     
+    # Inflation actuelle par catégorie issue des sources, si disponible
+    inflation_sources = load_macro_inputs()['valeurs'].get('inflation_categories', {})
+    for categorie, actuel in inflation_sources.items():
+        if categorie in categories_inflation:
+            categories_inflation[categorie]['actuel'] = actuel
+    
     # Scénarios d'inflation
     scenarios = {
         'Optimiste': {'inflation': 1.5, 'croissance': 1.8, 'impact_recettes': 2.3, 'impact_depenses': 1.8},
@@ -229,9 +773,11 @@ def generate_projections(budget_data, inflation_data, scenario='Base'):
     croissance_courante = scenario_params['croissance']
     
     for i, annee in enumerate(annees_projection):
-        # Facteurs d'ajustement progressifs
-        facteur_inflation = 1 + (inflation_courante / 100) * (1 - i * 0.1)  # Décroissance progressive
-        facteur_croissance = 1 + (croissance_courante / 100) * (1 - i * 0.05)
+        # Facteurs d'ajustement progressifs (bornés à zéro au-delà de 10 ans)
+        decroissance_inflation = max(1 - i * 0.1, 0.0)
+        decroissance_croissance = max(1 - i * 0.05, 0.0)
+        facteur_inflation = 1 + (inflation_courante / 100) * decroissance_inflation  # Décroissance progressive
+        facteur_croissance = 1 + (croissance_courante / 100) * decroissance_croissance
         
         # Impact de l'inflation sur les recettes et dépenses
         impact_recettes = scenario_params['impact_recettes'] / 100
@@ -252,15 +798,776 @@ def generate_projections(budget_data, inflation_data, scenario='Base'):
         projections['depenses'].append(depenses)
         projections['deficit'].append(deficit)
         projections['dette'].append(dette)
-        projections['inflation'].append(inflation_courante * (1 - i * 0.1))
-        projections['croissance'].append(croissance_courante * (1 - i * 0.05))
+        projections['inflation'].append(inflation_courante * decroissance_inflation)
+        projections['croissance'].append(croissance_courante * decroissance_croissance)
     
     return projections
 
+@st.cache_data(ttl=3600)
+def get_demographic_assumptions():
+    """Hypothèses démographiques et coûts du vieillissement (points d'ancrage jusqu'en 2070)"""
+    # Points d'ancrage (% du PIB pour les coûts, % pour la population active)
+    ancrages = {
+        'annees': [2025, 2030, 2040, 2050, 2060, 2070],
+        'ratio_dependance': [40.5, 44.8, 52.6, 56.9, 58.8, 60.1],  # 65 ans et + / 20-64 ans
+        'croissance_pop_active': [0.3, 0.1, -0.1, -0.1, -0.2, -0.2],
+        'pensions': [13.9, 14.0, 14.2, 14.0, 13.6, 13.2],
+        'sante': [8.9, 9.2, 9.7, 10.0, 10.2, 10.3],
+        'dependance': [1.9, 2.0, 2.4, 2.8, 3.0, 3.1],
+        'education': [5.0, 4.9, 4.8, 4.7, 4.7, 4.7]
+    }
+    
+    # Hypothèses macroéconomiques de long terme
+    hypotheses_lt = {
+        'productivite': 1.0,           # Croissance de la productivité (%)
+        'inflation_cible': 2.0,        # Ancrage de l'inflation (%)
+        'taux_apparent_initial': 1.7,  # Charge d'intérêts / dette (%)
+        'vitesse_convergence': 0.25,   # Convergence macro vers le long terme
+        'vitesse_refinancement': 0.125,  # Maturité moyenne de la dette ~8 ans
+        'cible_dette_s1': 60.0         # Cible de dette/PIB pour l'indicateur S1 (%)
+    }
+    
+    # Taux d'intérêt nominal de long terme par scénario (%)
+    taux_long_terme = {
+        'Optimiste': 3.2,
+        'Base': 3.5,
+        'Pessimiste': 4.2
+    }
+    
+    return {
+        'ancrages': ancrages,
+        'hypotheses_lt': hypotheses_lt,
+        'taux_long_terme': taux_long_terme
+    }
+
+@st.cache_data(ttl=3600)
+def build_demographic_path(demographic_data, annee_fin=2070):
+    """Interpole les trajectoires démographiques annuelles jusqu'à l'horizon"""
+    ancrages = demographic_data['ancrages']
+    annees = np.arange(2025, annee_fin + 1)
+    points = np.asarray(ancrages['annees'], dtype=float)
+    
+    chemin = {'annees': annees}
+    for serie in ('ratio_dependance', 'croissance_pop_active', 'pensions', 'sante', 'dependance', 'education'):
+        chemin[serie] = np.interp(annees, points, np.asarray(ancrages[serie], dtype=float))
+    
+    # Coût total du vieillissement et variation par rapport à 2025 (points de PIB)
+    cout_total = chemin['pensions'] + chemin['sante'] + chemin['dependance'] + chemin['education']
+    chemin['cout_vieillissement'] = cout_total
+    chemin['delta_vieillissement'] = cout_total - cout_total[0]
+    
+    return chemin
+
+def _trajectoire_dette(dette_initiale, solde_primaire, facteur_dynamique):
+    """Résout d_t = a_t * d_(t-1) - sp_t sous forme vectorisée (scénarios x années)"""
+    # A_t = produit cumulé des a_k ; d_t = A_t * (d_0 - somme(sp_k / A_k))
+    facteur_cumule = np.cumprod(facteur_dynamique, axis=1)
+    somme_actualisee = np.cumsum(solde_primaire / facteur_cumule, axis=1)
+    return facteur_cumule * (dette_initiale[:, None] - somme_actualisee), facteur_cumule
+
+def _ecarts_budgetaires(dette_initiale, solde_primaire, facteur_dynamique, facteur_cumule, trajectoire, cible):
+    """Calcule les indicateurs S1 (cible de dette à l'horizon) et S2 (stabilisation à horizon infini)"""
+    actualisation = 1.0 / facteur_cumule
+    somme_actualisation = actualisation.sum(axis=1)
+    
+    # S1 : ajustement permanent pour atteindre la cible de dette à l'horizon
+    s1 = (trajectoire[:, -1] - cible) / (facteur_cumule[:, -1] * somme_actualisation)
+    
+    # S2 : contrainte budgétaire intertemporelle, conditions figées au-delà de l'horizon
+    facteur_final = facteur_dynamique[:, -1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        queue = np.where(facteur_final > 1, 1.0 / (facteur_cumule[:, -1] * (facteur_final - 1)), np.nan)
+    valeur_soldes = (solde_primaire * actualisation).sum(axis=1) + solde_primaire[:, -1] * queue
+    s2 = (dette_initiale - valeur_soldes) / (somme_actualisation + queue)
+    
+    return s1, s2
+
+@st.cache_data(ttl=3600)
+def generate_long_term_projections(budget_data, inflation_data, annee_fin=2070):
+    """Projections de soutenabilité de long terme pour tous les scénarios (calcul matriciel)"""
+    demographie = get_demographic_assumptions()
+    chemin = build_demographic_path(demographie, annee_fin)
+    hyp = demographie['hypotheses_lt']
+    budget = budget_data['budget_2025']
+    
+    noms_scenarios = list(inflation_data['scenarios'].keys())
+    params = pd.DataFrame(inflation_data['scenarios']).T.loc[noms_scenarios]
+    inflation_s = params['inflation'].to_numpy(dtype=float)[:, None] / 100
+    croissance_s = params['croissance'].to_numpy(dtype=float)[:, None] / 100
+    taux_lt = np.array([demographie['taux_long_terme'].get(nom, demographie['taux_long_terme']['Base'])
+                        for nom in noms_scenarios])[:, None] / 100
+    
+    # Horizon de projection (t = 1 correspond à 2026)
+    annees = chemin['annees']
+    t = np.arange(1, len(annees))[None, :]
+    convergence = np.exp(-hyp['vitesse_convergence'] * t)
+    refinancement = np.exp(-hyp['vitesse_refinancement'] * t)
+    
+    # Trajectoires macroéconomiques convergeant vers le long terme
+    inflation_cible = hyp['inflation_cible'] / 100
+    croissance_potentielle = (hyp['productivite'] + chemin['croissance_pop_active'][1:])[None, :] / 100
+    inflation = inflation_cible + (inflation_s - inflation_cible) * convergence
+    croissance = croissance_potentielle + (croissance_s - croissance_potentielle) * convergence
+    croissance_nominale = (1 + croissance) * (1 + inflation) - 1
+    taux_apparent = taux_lt + (hyp['taux_apparent_initial'] / 100 - taux_lt) * refinancement
+    
+    # Solde primaire initial, ajusté de l'effet du scénario, puis dégradé par le vieillissement
+    pib = budget['pib']
+    charge_interets = hyp['taux_apparent_initial'] / 100 * budget['dette']
+    solde_primaire_initial = (budget['déficit'] + charge_interets) / pib
+    # Même amortissement des impacts (x 0.01) que le modèle de court terme
+    impact_recettes = params['impact_recettes'].to_numpy(dtype=float) / 100 * 0.01
+    impact_depenses = params['impact_depenses'].to_numpy(dtype=float) / 100 * 0.01
+    effet_scenario = (impact_recettes * budget['recettes_totales'] - impact_depenses * budget['dépenses_totales']) / pib
+    solde_primaire = (solde_primaire_initial + effet_scenario)[:, None] - chemin['delta_vieillissement'][None, 1:] / 100
+    
+    # Dynamique de la dette (ratio au PIB)
+    dette_initiale = np.full(len(noms_scenarios), budget['dette'] / pib)
+    facteur_dynamique = (1 + taux_apparent) / (1 + croissance_nominale)
+    trajectoire, facteur_cumule = _trajectoire_dette(dette_initiale, solde_primaire, facteur_dynamique)
+    s1, s2 = _ecarts_budgetaires(dette_initiale, solde_primaire, facteur_dynamique, facteur_cumule,
+                                 trajectoire, hyp['cible_dette_s1'] / 100)
+    
+    # Niveaux en Md€ (PIB nominal cumulé)
+    pib_nominal = pib * np.concatenate([np.ones((len(noms_scenarios), 1)),
+                                        np.cumprod(1 + croissance_nominale, axis=1)], axis=1)
+    dette_pib = np.concatenate([dette_initiale[:, None], trajectoire], axis=1)
+    
+    return {
+        'annees': annees,
+        'scenarios': noms_scenarios,
+        'dette_pib': dette_pib * 100,
+        'dette': dette_pib * pib_nominal,
+        'pib': pib_nominal,
+        'solde_primaire': np.concatenate([(solde_primaire_initial + effet_scenario)[:, None],
+                                          solde_primaire], axis=1) * 100,
+        'taux_apparent': taux_apparent * 100,
+        'croissance_nominale': croissance_nominale * 100,
+        'cout_vieillissement': chemin['cout_vieillissement'],
+        'ratio_dependance': chemin['ratio_dependance'],
+        'S1': s1 * 100,
+        'S2': s2 * 100
+    }
+
+@st.cache_data(ttl=3600, max_entries=8)
+def simulate_debt_paths(budget_data, inflation_data, scenario='Base', annee_fin=2070, n_chemins=1000, graine=2025):
+    """Simulation Monte Carlo de la dette/PIB autour de la trajectoire du scénario.
+    
+    Les percentiles portent sur toutes les trajectoires ; seul l'échantillon affichable
+    (budget de points d'une trace) est conservé en cache.
+    """
+    long_terme = generate_long_term_projections(budget_data, inflation_data, annee_fin)
+    idx = long_terme['scenarios'].index(scenario)
+    n_annees = len(long_terme['annees']) - 1
+    
+    # Chocs de croissance indépendants et dérive persistante des taux
+    rng = np.random.default_rng(graine)
+    choc_croissance = rng.normal(0, 1.0, (n_chemins, n_annees)) / 100
+    choc_taux = np.cumsum(rng.normal(0, 0.15, (n_chemins, n_annees)), axis=1) / 100
+    
+    taux = long_terme['taux_apparent'][idx] / 100 + choc_taux
+    croissance = long_terme['croissance_nominale'][idx] / 100 + choc_croissance
+    # Stabilisateurs automatiques : le solde primaire réagit à la croissance
+    solde_primaire = long_terme['solde_primaire'][idx, 1:] / 100 + 0.5 * choc_croissance
+    
+    dette_initiale = np.full(n_chemins, long_terme['dette_pib'][idx, 0] / 100)
+    trajectoire, _ = _trajectoire_dette(dette_initiale, solde_primaire, (1 + taux) / (1 + croissance))
+    chemins = np.concatenate([dette_initiale[:, None], trajectoire], axis=1) * 100
+    n_affiches = max(1, min(n_chemins, BUDGET_POINTS_TRACE // (chemins.shape[1] + 1)))
+    
+    return {
+        'annees': long_terme['annees'],
+        'chemins': chemins[np.linspace(0, n_chemins - 1, n_affiches).astype(int)],
+        'percentiles': dict(zip([5, 25, 50, 75, 95], np.percentile(chemins, [5, 25, 50, 75, 95], axis=0)))
+    }
+
+# Historique long (depuis 1958) : séries annuelles et mensuelles sur un index temporel trié
+COLONNES_HISTORIQUE = ['Recettes (Md€)', 'Dépenses (Md€)', 'Déficit (Md€)', 'Dette (Md€)',
+                       'PIB (Md€)', 'Dette/PIB (%)', 'Inflation (%)']
+FLUX_HISTORIQUE = ['Recettes (Md€)', 'Dépenses (Md€)', 'Déficit (Md€)']
+MOYENNES_HISTORIQUE = ['Inflation (%)']   # Taux annuels moyens
+
+@st.cache_data(ttl=3600)
+def get_historical_events():
+    """Événements marquants de l'histoire budgétaire (clé 'AAAA-MM')"""
+    return {
+        '1958-12': "Plan Pinay-Rueff",
+        '1968-05': "Mai 68",
+        '1973-10': "Premier choc pétrolier",
+        '1979-01': "Second choc pétrolier",
+        '1983-03': "Tournant de la rigueur",
+        '1992-02': "Traité de Maastricht",
+        '1993-01': "Récession",
+        '1999-01': "Passage à l'euro",
+        '2008-09': "Crise financière",
+        '2010-05': "Crise des dettes souveraines",
+        '2020-03': "Crise COVID-19",
+        '2022-02': "Crise énergétique",
+        '2023-01': "Inflation élevée"
+    }
+
+@st.cache_data(ttl=3600)
+def get_long_history():
+    """Séries budgétaires annuelles depuis 1958 (Md€ courants, francs convertis en euros).
+    
+    Les années anciennes sont reconstituées à partir de points d'ancrage (ratios au PIB,
+    inflation), interpolés entre deux ancrages ; la dernière décennie reprend les
+    données historiques du budget.
+    """
+    historique = get_budget_data_2025()['historique']
+    annees = np.arange(1958, historique['annees'][-1] + 1)
+    
+    # Points d'ancrage : PIB (Md€), recettes et dépenses de l'État (% PIB), dette publique (% PIB), inflation (%)
+    pib = {1958: 36, 1960: 46, 1965: 72, 1970: 127, 1975: 245, 1980: 446, 1985: 727, 1990: 1053,
+           1995: 1224, 2000: 1485, 2005: 1772, 2008: 1992, 2009: 1936, 2010: 1998, 2014: 2150, 2015: 2198,
+           2019: 2437, 2020: 2317, 2022: 2655, 2023: 2822, 2024: 2920}
+    recettes_pib = {1958: 17.0, 1963: 17.5, 1970: 17.0, 1974: 17.0, 1975: 16.5, 1980: 17.5, 1983: 17.2,
+                    1990: 17.5, 1993: 16.5, 2000: 18.0, 2007: 17.8, 2009: 15.5, 2010: 16.5, 2013: 18.4, 2014: 18.8}
+    depenses_pib = {1958: 18.5, 1963: 17.8, 1970: 16.8, 1974: 16.8, 1975: 19.0, 1980: 18.5, 1983: 20.5,
+                    1990: 19.0, 1993: 21.0, 2000: 19.8, 2007: 19.9, 2009: 22.5, 2010: 21.6, 2013: 20.2, 2014: 20.1}
+    dette_pib = {1958: 30.0, 1965: 22.0, 1974: 16.0, 1980: 20.7, 1985: 30.6, 1990: 35.4, 1993: 46.0,
+                 1995: 55.8, 2000: 58.9, 2007: 64.5, 2009: 83.0, 2012: 90.6, 2014: 95.0}
+    inflation = {1958: 15.1, 1959: 6.1, 1960: 4.1, 1963: 4.8, 1965: 2.7, 1968: 4.5, 1970: 5.2, 1973: 7.3,
+                 1974: 13.7, 1975: 11.8, 1977: 9.4, 1980: 13.6, 1981: 13.4, 1983: 9.6, 1985: 5.8, 1987: 3.1,
+                 1990: 3.4, 1993: 2.1, 1997: 1.2, 2000: 1.7, 2003: 2.1, 2007: 1.5, 2008: 2.8, 2009: 0.1,
+                 2011: 2.1, 2013: 0.9, 2014: 0.5}
+    
+    def interpoler(ancrages, log=False):
+        x, y = np.array(list(ancrages)), np.array(list(ancrages.values()), dtype=float)
+        return np.exp(np.interp(annees, x, np.log(y))) if log else np.interp(annees, x, y)
+    
+    pib_serie = interpoler(pib, log=True)
+    annuel = pd.DataFrame({
+        'Recettes (Md€)': interpoler(recettes_pib) * pib_serie / 100,
+        'Dépenses (Md€)': interpoler(depenses_pib) * pib_serie / 100,
+        'Dette (Md€)': interpoler(dette_pib) * pib_serie / 100,
+        'PIB (Md€)': pib_serie,
+        'Inflation (%)': interpoler(inflation)
+    }, index=pd.Index(annees, name='Année'))
+    
+    # Dernière décennie : données historiques du budget
+    recentes = pd.DataFrame({
+        'Recettes (Md€)': historique['recettes'],
+        'Dépenses (Md€)': historique['depenses'],
+        'Dette (Md€)': historique['dette'],
+        'Inflation (%)': historique['inflation']
+    }, index=historique['annees'])
+    annuel.update(recentes)
+    
+    annuel['Déficit (Md€)'] = annuel['Recettes (Md€)'] - annuel['Dépenses (Md€)']
+    annuel['Dette/PIB (%)'] = annuel['Dette (Md€)'] / annuel['PIB (Md€)'] * 100
+    return annuel[COLONNES_HISTORIQUE]
+
+# Profils saisonniers mensuels (acomptes d'IS en mars, juin, septembre, décembre ; fin de gestion en décembre)
+PROFIL_RECETTES = np.array([0.07, 0.07, 0.10, 0.07, 0.08, 0.10, 0.07, 0.06, 0.10, 0.08, 0.09, 0.11])
+PROFIL_DEPENSES = np.array([0.08, 0.08, 0.08, 0.08, 0.08, 0.08, 0.08, 0.07, 0.08, 0.08, 0.08, 0.13])
+
+@st.cache_data(ttl=3600)
+def build_monthly_history(annuel, graine=1958):
+    """Déclinaison mensuelle des séries annuelles.
+    
+    Les flux suivent un profil saisonnier bruité, renormalisé pour que chaque année
+    retrouve exactement son total annuel ; la dette et le PIB glissant sont
+    interpolés entre fins d'année et valent la donnée annuelle en décembre ;
+    l'inflation mensuelle est recalée sur sa moyenne annuelle.
+    """
+    rng = np.random.default_rng(graine)
+    n = len(annuel)
+    mois = np.arange(n * 12)
+    fins_annee = np.arange(n) * 12 + 11
+    
+    def flux(total, profil, bruit):
+        poids = profil[None, :] * rng.lognormal(0, bruit, (n, 12))
+        poids /= poids.sum(axis=1, keepdims=True)
+        return (total[:, None] * poids).ravel()
+    
+    recettes = flux(annuel['Recettes (Md€)'].to_numpy(), PROFIL_RECETTES, 0.05)
+    depenses = flux(annuel['Dépenses (Md€)'].to_numpy(), PROFIL_DEPENSES, 0.03)
+    
+    dette = np.exp(np.interp(mois, fins_annee, np.log(annuel['Dette (Md€)'].to_numpy())))
+    dette *= 1 + rng.normal(0, 0.003, len(mois))
+    dette[fins_annee] = annuel['Dette (Md€)'].to_numpy()
+    
+    # PIB annuel glissant : égal au PIB de l'année civile en décembre
+    pib = np.exp(np.interp(mois, fins_annee, np.log(annuel['PIB (Md€)'].to_numpy())))
+    inflation = np.interp(mois, fins_annee - 6, annuel['Inflation (%)'].to_numpy()) + rng.normal(0, 0.15, len(mois))
+    # Recalage : la moyenne des douze mois redonne l'inflation annuelle
+    inflation += np.repeat(annuel['Inflation (%)'].to_numpy() - inflation.reshape(n, 12).mean(axis=1), 12)
+    
+    mensuel = pd.DataFrame({
+        'Recettes (Md€)': recettes,
+        'Dépenses (Md€)': depenses,
+        'Déficit (Md€)': recettes - depenses,
+        'Dette (Md€)': dette,
+        'PIB (Md€)': pib,
+        'Dette/PIB (%)': dette / pib * 100,
+        'Inflation (%)': inflation
+    }, index=pd.date_range(f'{annuel.index[0]}-01-01', periods=len(mois), freq='MS', name='Mois'))
+    return mensuel
+
+def detect_breakpoints(valeurs, n_ruptures=4, taille_min=4, seuil=0.05):
+    """Ruptures de tendance par segmentation binaire sur les variations annuelles.
+    
+    À chaque étape, le segment dont la coupure réduit le plus la somme des carrés
+    des écarts à la moyenne (variations supposées constantes par régime) est coupé ;
+    on s'arrête quand le gain devient inférieur à `seuil` × la dispersion totale.
+    Renvoie les indices (dans `valeurs`) des points d'inflexion.
+    """
+    variations = np.diff(np.asarray(valeurs, dtype=float))
+    cumul = np.concatenate([[0.0], np.cumsum(variations)])
+    cumul2 = np.concatenate([[0.0], np.cumsum(variations ** 2)])
+    
+    def cout(debut, fin):
+        return (cumul2[fin] - cumul2[debut]) - (cumul[fin] - cumul[debut]) ** 2 / (fin - debut)
+    
+    total = cout(0, len(variations))
+    segments = [(0, len(variations))]
+    ruptures = []
+    for _ in range(n_ruptures):
+        meilleur = None
+        for debut, fin in segments:
+            if fin - debut < 2 * taille_min:
+                continue
+            coupures = np.arange(debut + taille_min, fin - taille_min + 1)
+            gains = cout(debut, fin) - cout(debut, coupures) - cout(coupures, fin)
+            k = int(np.argmax(gains))
+            if meilleur is None or gains[k] > meilleur[0]:
+                meilleur = (gains[k], debut, fin, int(coupures[k]))
+        if meilleur is None or meilleur[0] < seuil * total:
+            break
+        _, debut, fin, coupure = meilleur
+        segments.remove((debut, fin))
+        segments += [(debut, coupure), (coupure, fin)]
+        ruptures.append(coupure)
+    return sorted(ruptures)
+
+class HistoricalIndex:
+    """Séries historiques sur un index temporel trié, avec agrégats précalculés.
+    
+    Une période (curseur) se traduit en tranche par recherche dichotomique sur
+    l'index. Les moyennes se déduisent des sommes cumulées, les extrema d'une table
+    creuse (O(1) par requête). Les niveaux de début et de fin sont ceux de l'année
+    civile (cumul pour les flux, moyenne pour les taux annuels moyens, décembre pour
+    les encours), identiques en annuel et en mensuel : rien n'est recalculé quand la
+    période change.
+    Les ruptures de tendance sont détectées une fois par série, sur l'historique complet.
+    """
+    
+    def __init__(self, series, flux=(), moyennes=(), periodes_par_an=1):
+        self.series = series
+        self.colonnes = list(series.columns)
+        self.periodes_par_an = periodes_par_an
+        dates = series.index if isinstance(series.index, pd.DatetimeIndex) else pd.to_datetime(series.index.astype(str))
+        self.dates = pd.DatetimeIndex(dates)
+        if not self.dates.is_monotonic_increasing:
+            raise ValueError("L'index temporel doit être trié")
+        
+        valeurs = series.to_numpy(dtype=float)
+        self.valeurs = valeurs
+        self._cumul = np.vstack([np.zeros(valeurs.shape[1]), np.cumsum(valeurs, axis=0)])
+        
+        if len(valeurs) % periodes_par_an:
+            raise ValueError("L'historique doit couvrir des années civiles complètes")
+        
+        # Niveaux de l'année civile : cumul pour les flux, moyenne pour les taux moyens, dernière valeur sinon
+        fins_annee = np.arange(periodes_par_an - 1, len(valeurs), periodes_par_an)
+        cumul_annuel = self._cumul[fins_annee + 1] - self._cumul[fins_annee + 1 - periodes_par_an]
+        colonnes_flux = [self.colonnes.index(colonne) for colonne in flux]
+        colonnes_moyennes = [self.colonnes.index(colonne) for colonne in moyennes]
+        self.niveaux = valeurs[fins_annee].copy()
+        self.niveaux[:, colonnes_flux] = cumul_annuel[:, colonnes_flux]
+        self.niveaux[:, colonnes_moyennes] = cumul_annuel[:, colonnes_moyennes] / periodes_par_an
+        self.annees = self.dates[fins_annee].year
+        
+        # Tables creuses des minima et maxima sur des fenêtres de 2^k points
+        self._minima, self._maxima = [valeurs], [valeurs]
+        largeur = 1
+        while 2 * largeur <= len(valeurs):
+            self._minima.append(np.minimum(self._minima[-1][:-largeur], self._minima[-1][largeur:]))
+            self._maxima.append(np.maximum(self._maxima[-1][:-largeur], self._maxima[-1][largeur:]))
+            largeur *= 2
+        
+        self._ruptures = {}
+    
+    def tranche(self, annee_debut, annee_fin):
+        """Tranche des observations entre le début de `annee_debut` et la fin de `annee_fin`"""
+        debut = self.dates.searchsorted(pd.Timestamp(year=annee_debut, month=1, day=1))
+        fin = self.dates.searchsorted(pd.Timestamp(year=annee_fin + 1, month=1, day=1))
+        return slice(int(debut), int(fin))
+    
+    def frame(self, annee_debut, annee_fin):
+        """Observations de la période (vue sur les séries)"""
+        return self.series.iloc[self.tranche(annee_debut, annee_fin)]
+    
+    def statistiques(self, annee_debut, annee_fin):
+        """Statistiques de la période sur les niveaux annuels : début, fin, variation et TCAM par série"""
+        periode = self.tranche(annee_debut, annee_fin)
+        premiere, derniere = periode.start // self.periodes_par_an, periode.stop // self.periodes_par_an - 1
+        if derniere < premiere:
+            return pd.DataFrame(index=self.colonnes)
+        
+        niveau_debut, niveau_fin = self.niveaux[premiere], self.niveaux[derniere]
+        duree = derniere - premiere
+        taux = np.array([colonne.endswith('(%)') for colonne in self.colonnes])
+        positif = (niveau_debut > 0) & (niveau_fin > 0) & ~taux
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variation = np.where(positif, (niveau_fin / niveau_debut - 1) * 100, np.nan)
+            tcam = np.where(positif, ((niveau_fin / niveau_debut) ** (1 / duree) - 1) * 100, np.nan) if duree > 0 \
+                else np.full(len(self.colonnes), np.nan)
+        
+        return pd.DataFrame({
+            'Début': niveau_debut,
+            'Fin': niveau_fin,
+            'Écart': niveau_fin - niveau_debut,
+            'Variation (%)': variation,
+            'TCAM (%)': tcam
+        }, index=pd.Index(self.colonnes, name='Série'))
+    
+    def distribution(self, annee_debut, annee_fin):
+        """Moyenne et extrema des observations de la période (valeurs mensuelles en mensuel)"""
+        periode = self.tranche(annee_debut, annee_fin)
+        debut, fin = periode.start, periode.stop
+        if fin - debut < 1:
+            return pd.DataFrame(index=self.colonnes)
+        
+        niveau = int(np.log2(fin - debut))
+        largeur = 2 ** niveau
+        return pd.DataFrame({
+            'Moyenne': (self._cumul[fin] - self._cumul[debut]) / (fin - debut),
+            'Min': np.minimum(self._minima[niveau][debut], self._minima[niveau][fin - largeur]),
+            'Max': np.maximum(self._maxima[niveau][debut], self._maxima[niveau][fin - largeur])
+        }, index=pd.Index(self.colonnes, name='Série'))
+    
+    def ruptures(self, colonne, n_ruptures=4):
+        """Années de rupture de tendance d'une série (calculées une fois, sur les niveaux annuels)"""
+        if (colonne, n_ruptures) not in self._ruptures:
+            niveaux = self.niveaux[:, self.colonnes.index(colonne)]
+            self._ruptures[(colonne, n_ruptures)] = [int(self.annees[i])
+                                                     for i in detect_breakpoints(niveaux, n_ruptures)]
+        return self._ruptures[(colonne, n_ruptures)]
+
+@st.cache_resource
+def get_historical_index(granularite='Annuelle'):
+    """Index de l'historique long (annuel ou mensuel), partagé et en lecture seule"""
+    annuel = get_long_history()
+    if granularite == 'Mensuelle':
+        return HistoricalIndex(build_monthly_history(annuel), FLUX_HISTORIQUE, MOYENNES_HISTORIQUE,
+                               periodes_par_an=12)
+    return HistoricalIndex(annuel)
+
+# Export des données : lot multi-feuilles construit une seule fois par version des données
+EXPORT_DIR = Path(os.environ.get('LFI_EXPORT_DIR', Path(__file__).parent / 'exports'))
+EXPORT_CHUNK_ROWS = 50000   # Lignes écrites par bloc (CSV, groupe de lignes Parquet, lignes XLSX)
+EXPORT_SCHEMA_VERSION = 2   # À incrémenter à chaque changement des feuilles ou de leurs colonnes
+EXPORT_TMP_MAX_AGE = 3600   # Âge (s) au-delà duquel un fichier temporaire est considéré abandonné
+EXPORT_FORMATS = {
+    'XLSX': {'extension': 'xlsx', 'mime': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'},
+    'Parquet (zip)': {'extension': 'parquet.zip', 'mime': 'application/zip'},
+    'CSV (zip)': {'extension': 'csv.zip', 'mime': 'application/zip'}
+}
+
+def _serialiser_source(objet):
+    if isinstance(objet, pd.DataFrame):
+        return objet.reset_index().to_dict('split')
+    return str(objet)
+
+def dataset_version(*sources):
+    """Empreinte des données exportées : change dès qu'une source est modifiée"""
+    contenu = json.dumps(sources, sort_keys=True, default=_serialiser_source, ensure_ascii=False)
+    return hashlib.sha256(contenu.encode('utf-8')).hexdigest()[:12]
+
+def export_version(budget_data, inflation_data, vintages):
+    """Version d'un lot d'export : schéma des feuilles et toutes les données qu'il contient"""
+    return dataset_version(EXPORT_SCHEMA_VERSION, budget_data, inflation_data, vintages, get_long_history())
+
+def build_export_tables(budget_data, inflation_data, vintages):
+    """Rassemble les feuilles du lot d'export : synthèse, scénarios, lignes détaillées et historique"""
+    budget = budget_data['budget_2025']
+    synthese = pd.DataFrame({'Indicateur': list(budget), 'Valeur': list(budget.values())})
+    
+    # Projections de tous les scénarios, en format long
+    projections = []
+    for scenario in inflation_data['scenarios']:
+        resultat = generate_projections(budget_data, inflation_data, scenario)
+        projections.append(pd.DataFrame({
+            'Scénario': scenario,
+            'Année': resultat['annees'],
+            'Recettes (Md€)': resultat['recettes'],
+            'Dépenses (Md€)': resultat['depenses'],
+            'Déficit (Md€)': resultat['deficit'],
+            'Dette (Md€)': resultat['dette'],
+            'Inflation (%)': resultat['inflation'],
+            'Croissance (%)': resultat['croissance']
+        }))
+    hypotheses = pd.DataFrame.from_dict(inflation_data['scenarios'], orient='index')
+    hypotheses.index.name = 'Scénario'
+    
+    # Lignes détaillées : recettes, missions et tous les millésimes
+    lignes = BudgetLines.from_records(budget_data)
+    millesimes = build_vintage_table(vintages).reset_index().join(build_nomenclature_table(vintages), on='Code')
+    
+    return {
+        'Synthèse': synthese,
+        'Projections': pd.concat(projections, ignore_index=True),
+        'Hypothèses': hypotheses.reset_index(),
+        'Recettes': lignes.view('Recettes', 'Source'),
+        'Missions': lignes.view('Dépenses', 'Mission'),
+        'Millésimes': millesimes[['Millésime', 'Code', 'Libellé', 'Nature', 'Montant (Md€)']],
+        'Historique': get_long_history().reset_index(),
+        'Inflation': build_inflation_table(inflation_data['categories'])
+    }
+
+def _blocs(table):
+    """Découpe une table en blocs de EXPORT_CHUNK_ROWS lignes (au moins un bloc, même vide)"""
+    for debut in range(0, max(len(table), 1), EXPORT_CHUNK_ROWS):
+        yield table.iloc[debut:debut + EXPORT_CHUNK_ROWS]
+
+def _ecrire_csv_zip(tables, chemin):
+    """Une entrée CSV par feuille, écrite bloc par bloc dans l'archive"""
+    with zipfile.ZipFile(chemin, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for nom, table in tables.items():
+            with io.TextIOWrapper(archive.open(f'{nom}.csv', 'w', force_zip64=True),
+                                  encoding='utf-8', newline='') as fichier:
+                for i, bloc in enumerate(_blocs(table)):
+                    bloc.to_csv(fichier, index=False, header=i == 0)
+
+def _ecrire_parquet_zip(tables, chemin):
+    """Un fichier Parquet par feuille, un groupe de lignes par bloc (archive non recompressée)"""
+    with zipfile.ZipFile(chemin, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for nom, table in tables.items():
+            schema = pa.Schema.from_pandas(table, preserve_index=False)
+            with archive.open(f'{nom}.parquet', 'w', force_zip64=True) as fichier:
+                with pq.ParquetWriter(fichier, schema) as writer:
+                    for bloc in _blocs(table):
+                        writer.write_table(pa.Table.from_pandas(bloc, schema=schema, preserve_index=False))
+
+def _ecrire_xlsx(tables, chemin):
+    """Une feuille par table, en mode écriture seule (les lignes ne restent pas en mémoire)"""
+    classeur = Workbook(write_only=True)
+    for nom, table in tables.items():
+        feuille = classeur.create_sheet(title=nom[:31])
+        feuille.append(list(table.columns))
+        for bloc in _blocs(table):
+            valeurs = bloc.astype(object).where(bloc.notna(), None)
+            for ligne in valeurs.itertuples(index=False):
+                feuille.append(list(ligne))
+    classeur.save(chemin)
+
+EXPORT_WRITERS = {
+    'XLSX': _ecrire_xlsx,
+    'Parquet (zip)': _ecrire_parquet_zip,
+    'CSV (zip)': _ecrire_csv_zip
+}
+
+@st.cache_resource(max_entries=2 * len(EXPORT_FORMATS))
+def build_export_bundle(version, format_export, _tables):
+    """Construit le lot d'export d'une version des données, partagé par toutes les sessions.
+    
+    Le fichier est écrit bloc par bloc sur disque (une seule fois par version et par
+    format, y compris entre redémarrages), puis chargé une fois : le même objet est
+    servi à chaque téléchargement, sans reconstruction ni copie par requête.
+    """
+    chemin = EXPORT_DIR / f"lfi2025_{version}.{EXPORT_FORMATS[format_export]['extension']}"
+    if not chemin.exists():
+        EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+        temporaire = chemin.with_name(f'{chemin.name}.{os.getpid()}.tmp')
+        try:
+            EXPORT_WRITERS[format_export](_tables(), temporaire)
+            os.replace(temporaire, chemin)
+        finally:
+            temporaire.unlink(missing_ok=True)
+        _nettoyer_exports(version)
+    return chemin.read_bytes()
+
+def _nettoyer_exports(version):
+    """Supprime les lots des versions précédentes et les fichiers temporaires abandonnés"""
+    for chemin in EXPORT_DIR.glob('lfi2025_*'):
+        try:
+            if chemin.name.endswith('.tmp'):
+                # Un fichier récent peut être en cours d'écriture par un autre processus
+                if time.time() - chemin.stat().st_mtime > EXPORT_TMP_MAX_AGE:
+                    chemin.unlink()
+            elif not chemin.name.startswith(f'lfi2025_{version}.'):
+                chemin.unlink()
+        except OSError:
+            pass
+
+# Pipeline de graphiques : WebGL et sous-échantillonnage LTTB pour les longues séries
+SEUIL_WEBGL = 1000            # Points au-delà desquels la trace passe en Scattergl
+RESOLUTION_VIEWPORT = 1200    # Points utiles pour la largeur d'un graphique
+BUDGET_POINTS_TRACE = 20000   # Points maximum pour une trace de trajectoires multiples
+
+def _axe_numerique(x):
+    """Convertit un axe (numérique ou dates) en float pour les calculs géométriques"""
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype('int64').astype(float)
+    return x.astype(float)
+
+def lttb_indices(x, y, n_points):
+    """Indices retenus par l'algorithme Largest-Triangle-Three-Buckets"""
+    n = len(x)
+    if n_points >= n or n_points < 3:
+        return np.arange(n)
+    
+    x = _axe_numerique(x)
+    y = np.asarray(y, dtype=float)
+    bornes = np.linspace(1, n - 1, n_points - 1).astype(int)
+    
+    indices = np.empty(n_points, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    precedent = 0
+    for i in range(n_points - 2):
+        debut, fin = bornes[i], bornes[i + 1]
+        # Point moyen du seau suivant (ou dernier point)
+        suivant_debut, suivant_fin = (bornes[i + 1], bornes[i + 2]) if i + 2 < len(bornes) else (n - 1, n)
+        x_moyen = x[suivant_debut:suivant_fin].mean()
+        y_moyen = y[suivant_debut:suivant_fin].mean()
+        
+        # Point du seau formant le plus grand triangle avec le précédent et le point moyen
+        aires = np.abs((x[precedent] - x_moyen) * (y[debut:fin] - y[precedent])
+                       - (x[precedent] - x[debut:fin]) * (y_moyen - y[precedent]))
+        precedent = debut + int(np.argmax(aires))
+        indices[i + 1] = precedent
+    
+    return indices
+
+@st.cache_data(ttl=3600)
+def build_lttb_pyramid(x, y, resolution=RESOLUTION_VIEWPORT, facteur=4, points_max=RESOLUTION_VIEWPORT * 16):
+    """Pyramide multi-résolution : niveaux LTTB de plus en plus fins, puis la série complète"""
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    
+    # Les fenêtres plus fines que le dernier niveau sont servies depuis la série complète
+    niveaux = []
+    n_points = resolution
+    while n_points < len(x) and n_points <= points_max:
+        indices = lttb_indices(x, y, n_points)
+        niveaux.append((x[indices], y[indices]))
+        n_points *= facteur
+    niveaux.append((x, y))
+    
+    return niveaux
+
+def query_lttb_pyramid(niveaux, x_range=None, resolution=RESOLUTION_VIEWPORT):
+    """Extrait la fenêtre demandée au niveau de détail suffisant pour la résolution"""
+    for niveau, (x, y) in enumerate(niveaux):
+        if x_range is None:
+            debut, fin = 0, len(x)
+        else:
+            debut, fin = np.searchsorted(x, x_range[0], side='left'), np.searchsorted(x, x_range[1], side='right')
+        # Premier niveau offrant assez de points dans la fenêtre (ou série complète)
+        if fin - debut >= resolution or niveau == len(niveaux) - 1:
+            break
+    
+    x, y = x[debut:fin], y[debut:fin]
+    indices = lttb_indices(x, y, resolution)
+    return x[indices], y[indices]
+
+def make_line_trace(x, y, name, x_range=None, resolution=RESOLUTION_VIEWPORT, **trace_args):
+    """Trace linéaire adaptative : Scatter pour les séries courtes, Scattergl + LTTB au-delà du seuil"""
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    
+    if len(x) > SEUIL_WEBGL:
+        x, y = query_lttb_pyramid(build_lttb_pyramid(x, y, resolution), x_range, resolution)
+        return go.Scattergl(x=x, y=y, name=name, **trace_args)
+    
+    if x_range is not None:
+        masque = (x >= x_range[0]) & (x <= x_range[1])
+        x, y = x[masque], y[masque]
+    return go.Scatter(x=x, y=y, name=name, **trace_args)
+
+def make_paths_trace(x, chemins, name, x_range=None, budget_points=BUDGET_POINTS_TRACE, **trace_args):
+    """Trace unique de trajectoires multiples (séparées par des NaN), échantillonnées selon un budget de points"""
+    x = np.asarray(x)
+    if x_range is not None:
+        masque = (x >= x_range[0]) & (x <= x_range[1])
+        x, chemins = x[masque], chemins[:, masque]
+    
+    # Échantillonnage régulier des trajectoires pour respecter le budget de points
+    n_affiches = max(1, min(len(chemins), budget_points // (len(x) + 1)))
+    echantillon = chemins[np.linspace(0, len(chemins) - 1, n_affiches).astype(int)]
+    
+    x_trace = np.tile(np.append(x.astype(float), np.nan), n_affiches)
+    y_trace = np.column_stack([echantillon, np.full(n_affiches, np.nan)]).ravel()
+    trace = go.Scattergl if len(x_trace) > SEUIL_WEBGL else go.Scatter
+    return trace(x=x_trace, y=y_trace, name=name, **trace_args)
+
+def annotate_timeline(fig, evenements, ruptures=(), mensuel=False):
+    """Annote un graphique temporel : événements (pointillés libellés) et ruptures de tendance (tirets)"""
+    for date, libelle in evenements.items():
+        x = pd.Timestamp(date) if mensuel else int(date[:4])
+        fig.add_vline(x=x, line_dash='dot', line_color='grey', opacity=0.6)
+        fig.add_annotation(x=x, y=1, xref='x', yref='paper', text=libelle, showarrow=False, textangle=-90,
+                           xanchor='right', yanchor='top', font=dict(size=10, color='grey'))
+    for annee in ruptures:
+        x = pd.Timestamp(year=annee, month=1, day=1) if mensuel else annee
+        fig.add_vline(x=x, line_dash='dash', line_color='#EF4135', opacity=0.5)
+        fig.add_annotation(x=x, y=0, xref='x', yref='paper', text=f'Rupture {annee}', showarrow=False,
+                           textangle=-90, xanchor='left', yanchor='bottom', font=dict(size=10, color='#EF4135'))
+
+# Composants HTML : chaque grille, carte ou liste est compilée en un seul élément
+def render_kpi_grid(kpi_df):
+    """Compile une grille de KPI (valeur, unite, label, variation, classe) en un seul bloc HTML"""
+    cartes = ('<div class="kpi-card"><div class="kpi-value">' + kpi_df['valeur'].round(1).astype(str)
+              + kpi_df['unite'] + '</div><div class="kpi-label">' + kpi_df['label']
+              + '</div><div class="kpi-change ' + kpi_df['classe'] + '">' + kpi_df['variation'] + '</div></div>')
+    return f'<div class="kpi-grid">{cartes.str.cat()}</div>'
+
+def render_html_list(libelles, valeurs, unite=''):
+    """Compile une liste HTML à partir de deux séries alignées"""
+    items = '<li>' + libelles.astype(str) + ': ' + valeurs.round(1).astype(str) + unite + '</li>'
+    return f'<ul>{items.str.cat()}</ul>'
+
+def render_card(classe, titre, contenu):
+    """Compile une carte HTML (titre + contenu déjà rendu)"""
+    return f'<div class="{classe}"><h4>{titre}</h4>{contenu}</div>'
+
+def format_variation(valeur, unite='%'):
+    """Formate une variation signée (n.d. si non calculable)"""
+    return f'{valeur:+.1f}{unite}' if pd.notna(valeur) else 'n.d.'
+
+def install_render_stats():
+    """Compte les éléments et octets envoyés au navigateur pendant la réexécution courante.
+    
+    Le compteur s'appuie sur un attribut interne de Streamlit (ScriptRunContext._enqueue) :
+    s'il est absent, le compteur est désactivé et la fonction renvoie None.
+    """
+    stats = st.session_state.render_stats
+    stats.update({'elements': 0, 'octets': 0})
+    
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    
+    try:
+        if getattr(ctx._enqueue, 'render_stats', None) is stats:
+            return stats
+        
+        enqueue = getattr(ctx._enqueue, '__wrapped__', ctx._enqueue)
+        
+        def enqueue_avec_stats(msg):
+            if msg.WhichOneof('type') == 'delta':
+                stats['elements'] += 1
+                stats['octets'] += msg.ByteSize()
+            enqueue(msg)
+        
+        enqueue_avec_stats.__wrapped__ = enqueue
+        enqueue_avec_stats.render_stats = stats
+        ctx._enqueue = enqueue_avec_stats
+    except AttributeError:
+        return None
+    return stats
+
 class LoiFinanceDashboard:
     def __init__(self):
         self.budget_data = get_budget_data_2025()
         self.inflation_data = get_inflation_projections()
+        self.budget_lines = get_budget_lines()
+        self.vintages = get_budget_vintages()
+        self.vintage_table = build_vintage_table(self.vintages)
+        self.nomenclature_table = build_nomenclature_table(self.vintages)
         
     def display_header(self):
         """Affiche l'en-tête du dashboard"""
@@ -292,96 +1599,45 @@ class LoiFinanceDashboard:
         recettes_pib = (budget['recettes_totales'] / budget['pib']) * 100
         depenses_pib = (budget['dépenses_totales'] / budget['pib']) * 100
         
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            st.markdown(f"""
-            <div class="kpi-card">
-                <div class="kpi-value">{budget['recettes_totales']:.1f} Md€</div>
-                <div class="kpi-label">Recettes Totales</div>
-                <div class="kpi-change positive">+{recettes_pib:.1f}% du PIB</div>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col2:
-            st.markdown(f"""
-            <div class="kpi-card">
-                <div class="kpi-value">{budget['dépenses_totales']:.1f} Md€</div>
-                <div class="kpi-label">Dépenses Totales</div>
-                <div class="kpi-change positive">+{depenses_pib:.1f}% du PIB</div>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col3:
-            st.markdown(f"""
-            <div class="kpi-card">
-                <div class="kpi-value">{abs(budget['déficit']):.1f} Md€</div>
-                <div class="kpi-label">Déficit Budgétaire</div>
-                <div class="kpi-change {'positive' if budget['déficit'] > 0 else 'negative'}">{deficit_pib:.1f}% du PIB</div>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col4:
-            st.markdown(f"""
-            <div class="kpi-card">
-                <div class="kpi-value">{budget['dette']:.1f} Md€</div>
-                <div class="kpi-label">Dette Publique</div>
-                <div class="kpi-change {'negative' if dette_pib > 60 else 'positive'}">{dette_pib:.1f}% du PIB</div>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        # Deuxième ligne de KPI
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            st.markdown(f"""
-            <div class="kpi-card">
-                <div class="kpi-value">{budget['inflation_prevue']:.1f}%</div>
-                <div class="kpi-label">Inflation Prévue</div>
-                <div class="kpi-change neutral">Objectif BCE</div>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col2:
-            st.markdown(f"""
-            <div class="kpi-card">
-                <div class="kpi-value">{budget['croissance_pib']:.1f}%</div>
-                <div class="kpi-label">Croissance PIB</div>
-                <div class="kpi-change positive">+0.2% vs 2024</div>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col3:
-            st.markdown(f"""
-            <div class="kpi-card">
-                <div class="kpi-value">{budget['taux_chômage']:.1f}%</div>
-                <div class="kpi-label">Taux de Chômage</div>
-                <div class="kpi-change positive">-0.5% vs 2024</div>
-            </div>
-            """, unsafe_allow_html=True)
+        # Grille des 8 KPI compilée en un seul élément
+        kpi_df = pd.DataFrame([
+            {'valeur': budget['recettes_totales'], 'unite': ' Md€', 'label': 'Recettes Totales',
+             'variation': f"+{recettes_pib:.1f}% du PIB", 'classe': 'positive'},
+            {'valeur': budget['dépenses_totales'], 'unite': ' Md€', 'label': 'Dépenses Totales',
+             'variation': f"+{depenses_pib:.1f}% du PIB", 'classe': 'positive'},
+            {'valeur': abs(budget['déficit']), 'unite': ' Md€', 'label': 'Déficit Budgétaire',
+             'variation': f"{deficit_pib:.1f}% du PIB", 'classe': 'positive' if budget['déficit'] > 0 else 'negative'},
+            {'valeur': budget['dette'], 'unite': ' Md€', 'label': 'Dette Publique',
+             'variation': f"{dette_pib:.1f}% du PIB", 'classe': 'negative' if dette_pib > 60 else 'positive'},
+            {'valeur': budget['inflation_prevue'], 'unite': '%', 'label': 'Inflation Prévue',
+             'variation': 'Objectif BCE', 'classe': 'neutral'},
+            {'valeur': budget['croissance_pib'], 'unite': '%', 'label': 'Croissance PIB',
+             'variation': '+0.2% vs 2024', 'classe': 'positive'},
+            {'valeur': budget['taux_chômage'], 'unite': '%', 'label': 'Taux de Chômage',
+             'variation': '-0.5% vs 2024', 'classe': 'positive'},
+            {'valeur': (budget['recettes_totales']/budget['dépenses_totales'])*100, 'unite': '%',
+             'label': 'Taux de Couverture', 'variation': '+1.2% vs 2024', 'classe': 'positive'}
+        ])
         
-        with col4:
-            st.markdown(f"""
-            <div class="kpi-card">
-                <div class="kpi-value">{(budget['recettes_totales']/budget['dépenses_totales'])*100:.1f}%</div>
-                <div class="kpi-label">Taux de Couverture</div>
-                <div class="kpi-change positive">+1.2% vs 2024</div>
-            </div>
-            """, unsafe_allow_html=True)
+        st.markdown(render_kpi_grid(kpi_df), unsafe_allow_html=True)
     
     def create_budget_structure(self):
         """Analyse détaillée de la structure budgétaire"""
         st.markdown('<h3 class="section-header">🏛️ STRUCTURE DÉTAILLÉE DU BUDGET 2025</h3>', 
                    unsafe_allow_html=True)
         
-        tab1, tab2, tab3 = st.tabs(["Analyse des Recettes", "Analyse des Dépenses", "Répartition par Mission"])
+        tab1, tab2, tab3, tab4 = st.tabs(["Analyse des Recettes", "Analyse des Dépenses", "Répartition par Mission",
+                                          "Comparaison des Millésimes"])
+        
+        # Variations calculées par rapport à la LFI précédente
+        variations = compare_vintages(self.vintage_table, self.nomenclature_table,
+                                      'LFI 2024', 'LFI 2025')['Variation (%)'].round(1)
         
         with tab1:
             # Analyse des recettes
-            recettes_df = pd.DataFrame([
-                {'Catégorie': cat, 'Montant (Md€)': data['montant'], 'Poids (%)': data['poids'], 'Variation (%)': data['variation']}
-                for cat, data in self.budget_data['recettes_detail'].items()
-            ])
+            recettes_df = self.budget_lines.view('Recettes', 'Catégorie')
+            recettes_df['Poids (%)'] = recettes_df['Poids (%)'].round(1)
+            recettes_df['Variation (%)'] = variations.reindex(recettes_df['Code']).to_numpy()
             
             col1, col2 = st.columns(2)
             
@@ -403,10 +1659,9 @@ class LoiFinanceDashboard:
         
         with tab2:
             # Analyse des dépenses
-            depenses_df = pd.DataFrame([
-                {'Mission': mission, 'Montant (Md€)': data['montant'], 'Poids (%)': data['poids'], 'Variation (%)': data['variation']}
-                for mission, data in self.budget_data['depenses_missions'].items()
-            ])
+            depenses_df = self.budget_lines.view('Dépenses', 'Mission')
+            depenses_df['Poids (%)'] = depenses_df['Poids (%)'].round(1)
+            depenses_df['Variation (%)'] = variations.reindex(depenses_df['Code']).to_numpy()
             
             col1, col2 = st.columns(2)
             
@@ -472,6 +1727,45 @@ class LoiFinanceDashboard:
                     }
                 ))
                 st.plotly_chart(fig, use_container_width=True)
+        
+        with tab4:
+            self.create_vintage_comparison()
+    
+    def create_vintage_comparison(self):
+        """Comparaison ligne à ligne entre deux millésimes budgétaires"""
+        noms_millesimes = list(self.vintages['millesimes'].keys())
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            reference = st.selectbox("Millésime de référence:", options=noms_millesimes,
+                                     index=noms_millesimes.index('LFI 2024'), key="vintage_reference")
+        with col2:
+            cible = st.selectbox("Millésime comparé:", options=noms_millesimes,
+                                 index=noms_millesimes.index('LFI 2025'), key="vintage_cible")
+        
+        diff = compare_vintages(self.vintage_table, self.nomenclature_table, reference, cible)
+        
+        # Synthèse par nature (nature absente des deux millésimes : écart nul)
+        synthese = diff.groupby('Nature')[[*vintage_columns(reference, cible), 'Écart (Md€)']].sum()
+        synthese = synthese.reindex(['Recettes', 'Dépenses'], fill_value=0.0)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Écart Recettes", f"{synthese.loc['Recettes', 'Écart (Md€)']:+.1f} Md€")
+        with col2:
+            st.metric("Écart Dépenses", f"{synthese.loc['Dépenses', 'Écart (Md€)']:+.1f} Md€")
+        with col3:
+            st.metric("Lignes modifiées", f"{(diff['Statut'] != 'Inchangée').sum()} / {len(diff)}")
+        
+        # Écarts mission par mission
+        missions = diff[diff['Nature'] == 'Dépenses'].sort_values('Écart (Md€)')
+        fig = px.bar(missions, x='Écart (Md€)', y='Libellé', orientation='h',
+                    title=f'Écarts par Mission - {cible} vs {reference}',
+                    color='Écart (Md€)', color_continuous_scale='RdYlGn')
+        st.plotly_chart(fig, use_container_width=True)
+        
+        # Détail ligne à ligne
+        st.subheader(f"Détail Ligne à Ligne - {cible} vs {reference}")
+        st.dataframe(diff.round(2), use_container_width=True)
     
     def create_inflation_analysis(self):
         """Analyse détaillée de l'inflation et son impact"""
@@ -479,13 +1773,7 @@ class LoiFinanceDashboard:
                    unsafe_allow_html=True)
         
         # Données d'inflation par catégorie
-        inflation_df = pd.DataFrame([
-            {'Catégorie': cat, 
-             'Inflation Actuelle (%)': data['actuel'], 
-             'Prévision 2025 (%)': data['prevision_2025'],
-             'Impact Budget (Md€)': data['impact_budget']}
-            for cat, data in self.inflation_data['categories'].items()
-        ])
+        inflation_df = build_inflation_table(self.inflation_data['categories'])
         
         col1, col2 = st.columns(2)
         
@@ -507,18 +1795,13 @@ class LoiFinanceDashboard:
         st.subheader("Analyse d'Impact de l'Inflation sur le Budget")
         
         impact_total = inflation_df['Impact Budget (Md€)'].sum()
-        st.markdown(f"""
-        <div class="inflation-card">
-            <h4>Impact Total de l'Inflation sur le Budget 2025</h4>
-            <p><strong>{impact_total:.1f} Md€</strong> d'impact budgétaire prévu lié à l'inflation</p>
-            <p>Répartition par catégorie:</p>
-            <ul>
-        """, unsafe_allow_html=True)
-        
-        for _, row in inflation_df.iterrows():
-            st.markdown(f"<li>{row['Catégorie']}: {row['Impact Budget (Md€)']:.1f} Md€</li>", unsafe_allow_html=True)
-        
-        st.markdown("</ul></div>", unsafe_allow_html=True)
+        repartition = render_html_list(inflation_df['Catégorie'], inflation_df['Impact Budget (Md€)'], ' Md€')
+        st.markdown(render_card(
+            'inflation-card',
+            "Impact Total de l'Inflation sur le Budget 2025",
+            f"<p><strong>{impact_total:.1f} Md€</strong> d'impact budgétaire prévu lié à l'inflation</p>"
+            f"<p>Répartition par catégorie:</p>{repartition}"
+        ), unsafe_allow_html=True)
         
         # Tableau détaillé
         st.dataframe(inflation_df, use_container_width=True)
@@ -560,18 +1843,18 @@ class LoiFinanceDashboard:
         with col1:
             # Projection des recettes et dépenses
             fig = go.Figure()
-            fig.add_trace(go.Scatter(
-                x=projections['annees'],
-                y=projections['recettes'],
+            fig.add_trace(make_line_trace(
+                projections['annees'],
+                projections['recettes'],
+                'Recettes',
                 mode='lines+markers',
-                name='Recettes',
                 line=dict(color='green', width=3)
             ))
-            fig.add_trace(go.Scatter(
-                x=projections['annees'],
-                y=projections['depenses'],
+            fig.add_trace(make_line_trace(
+                projections['annees'],
+                projections['depenses'],
+                'Dépenses',
                 mode='lines+markers',
-                name='Dépenses',
                 line=dict(color='red', width=3)
             ))
             fig.update_layout(
@@ -585,11 +1868,11 @@ class LoiFinanceDashboard:
             # Projection du déficit et de la dette
             fig = make_subplots(specs=[[{"secondary_y": True}]])
             fig.add_trace(
-                go.Scatter(x=projections['annees'], y=projections['deficit'], name='Déficit'),
+                make_line_trace(projections['annees'], projections['deficit'], 'Déficit'),
                 secondary_y=False,
             )
             fig.add_trace(
-                go.Scatter(x=projections['annees'], y=projections['dette'], name='Dette'),
+                make_line_trace(projections['annees'], projections['dette'], 'Dette'),
                 secondary_y=True,
             )
             fig.update_xaxes(title_text="Année")
@@ -611,108 +1894,350 @@ class LoiFinanceDashboard:
         
         st.subheader(f"Projections Détaillées - Scénario {scenario}")
         st.dataframe(projections_df, use_container_width=True)
+        
+        # Soutenabilité de long terme
+        self.create_sustainability_analysis(scenario)
+    
+    def create_sustainability_analysis(self, scenario):
+        """Analyse de soutenabilité de la dette à long terme (écarts S1/S2)"""
+        st.markdown('<h3 class="section-header">⏳ SOUTENABILITÉ DE LONG TERME</h3>',
+                   unsafe_allow_html=True)
+        
+        annee_fin = st.slider(
+            "Horizon de projection:",
+            min_value=2035,
+            max_value=2070,
+            value=2070,
+            step=5,
+            key="horizon_selector"
+        )
+        periode = st.slider(
+            "Période affichée:",
+            min_value=2025,
+            max_value=annee_fin,
+            value=(2025, annee_fin),
+            key=f"periode_selector_{annee_fin}"
+        )
+        
+        long_terme = generate_long_term_projections(self.budget_data, self.inflation_data, annee_fin)
+        idx = long_terme['scenarios'].index(scenario)
+        
+        # Indicateurs d'écart budgétaire du scénario sélectionné
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric(f"Dette/PIB {annee_fin}", f"{long_terme['dette_pib'][idx, -1]:.1f}%",
+                      f"{long_terme['dette_pib'][idx, -1] - long_terme['dette_pib'][idx, 0]:+.1f} pts")
+        with col2:
+            st.metric(f"Écart S1 (60% en {annee_fin})", f"{long_terme['S1'][idx]:.2f}% du PIB")
+        with col3:
+            s2 = long_terme['S2'][idx]
+            st.metric("Écart S2 (horizon infini)", f"{s2:.2f}% du PIB" if np.isfinite(s2) else "n.d. (r ≤ g)")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            # Trajectoire de la dette pour tous les scénarios
+            fig = go.Figure()
+            for i, nom in enumerate(long_terme['scenarios']):
+                fig.add_trace(make_line_trace(
+                    long_terme['annees'],
+                    long_terme['dette_pib'][i],
+                    nom,
+                    x_range=periode,
+                    mode='lines',
+                    line=dict(width=4 if nom == scenario else 2)
+                ))
+            fig.add_hline(y=60, line_dash="dash", line_color="gray")
+            fig.update_layout(
+                title=f'Trajectoire Dette/PIB à politique inchangée ({annee_fin})',
+                xaxis_title='Année',
+                yaxis_title='% du PIB'
+            )
+            st.plotly_chart(fig, use_container_width=True)
+        
+        with col2:
+            # Coûts liés au vieillissement et ratio de dépendance
+            fig = make_subplots(specs=[[{"secondary_y": True}]])
+            fig.add_trace(
+                go.Scatter(x=long_terme['annees'], y=long_terme['cout_vieillissement'],
+                           name='Coûts du vieillissement', fill='tozeroy'),
+                secondary_y=False,
+            )
+            fig.add_trace(
+                go.Scatter(x=long_terme['annees'], y=long_terme['ratio_dependance'],
+                           name='Ratio de dépendance'),
+                secondary_y=True,
+            )
+            fig.update_xaxes(title_text="Année")
+            fig.update_yaxes(title_text="% du PIB", secondary_y=False)
+            fig.update_yaxes(title_text="65+ / 20-64 ans (%)", secondary_y=True)
+            fig.update_layout(title_text='Démographie et Coûts du Vieillissement')
+            st.plotly_chart(fig, use_container_width=True)
+        
+        # Distribution stochastique de la dette (Monte Carlo)
+        st.subheader(f"Distribution Stochastique de la Dette - Scénario {scenario}")
+        n_chemins = st.select_slider(
+            "Nombre de trajectoires simulées:",
+            options=[100, 500, 1000, 5000, 20000],
+            value=1000,
+            key="mc_paths_selector"
+        )
+        simulation = simulate_debt_paths(self.budget_data, self.inflation_data, scenario, annee_fin, n_chemins)
+        
+        fig = go.Figure()
+        fig.add_trace(make_paths_trace(
+            simulation['annees'],
+            simulation['chemins'],
+            'Trajectoires simulées',
+            x_range=periode,
+            mode='lines',
+            line=dict(color='rgba(0, 85, 164, 0.08)', width=1),
+            hoverinfo='skip'
+        ))
+        for centile, style in ((5, 'dot'), (50, 'solid'), (95, 'dot')):
+            fig.add_trace(make_line_trace(
+                simulation['annees'],
+                simulation['percentiles'][centile],
+                f'P{centile}',
+                x_range=periode,
+                mode='lines',
+                line=dict(color='#EF4135', width=3 if centile == 50 else 2, dash=style)
+            ))
+        fig.update_layout(
+            title=f'Dette/PIB : {n_chemins} trajectoires simulées (P5 - P50 - P95)',
+            xaxis_title='Année',
+            yaxis_title='% du PIB'
+        )
+        st.plotly_chart(fig, use_container_width=True)
+        
+        # Synthèse des écarts pour tous les scénarios
+        ecarts_df = pd.DataFrame({
+            'Scénario': long_terme['scenarios'],
+            f'Dette/PIB {annee_fin} (%)': long_terme['dette_pib'][:, -1].round(1),
+            'Solde primaire final (% PIB)': long_terme['solde_primaire'][:, -1].round(2),
+            'S1 (% PIB)': long_terme['S1'].round(2),
+            'S2 (% PIB)': long_terme['S2'].round(2)
+        })
+        
+        st.subheader("Écarts de Soutenabilité par Scénario")
+        st.dataframe(ecarts_df, use_container_width=True)
     
     def create_historical_analysis(self):
-        """Analyse historique et tendances"""
+        """Analyse historique et tendances (historique long depuis 1958, annuel ou mensuel)"""
         st.markdown('<h3 class="section-header">📊 ANALYSE HISTORIQUE ET TENDANCES</h3>', 
                    unsafe_allow_html=True)
         
-        hist = self.budget_data['historique']
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            granularite = st.radio("Granularité", ['Annuelle', 'Mensuelle'], horizontal=True,
+                                   key="historique_granularite")
+        index = get_historical_index(granularite)
+        mensuel = granularite == 'Mensuelle'
+        
+        annee_min, annee_max = int(index.dates[0].year), int(index.dates[-1].year)
+        with col2:
+            debut, fin = st.slider(
+                "Période",
+                min_value=annee_min,
+                max_value=annee_max,
+                value=(annee_max - 9, annee_max),
+                key="historique_periode"
+            )
         
-        # Création du DataFrame historique
-        hist_df = pd.DataFrame({
-            'Année': hist['annees'],
-            'Recettes (Md€)': hist['recettes'],
-            'Dépenses (Md€)': hist['depenses'],
-            'Déficit (Md€)': hist['deficit'],
-            'Dette (Md€)': hist['dette'],
-            'Inflation (%)': hist['inflation']
-        })
+        # Requêtes sur l'index trié : tranche, statistiques et ruptures précalculées
+        hist_df = index.frame(debut, fin)
+        statistiques = index.statistiques(debut, fin)
+        distribution = index.distribution(debut, fin)
+        x = hist_df.index
+        evenements = {date: libelle for date, libelle in get_historical_events().items()
+                      if debut <= int(date[:4]) <= fin}
+        ruptures_dette = [annee for annee in index.ruptures('Dette/PIB (%)') if debut <= annee <= fin]
+        ruptures_depenses = [annee for annee in index.ruptures('Dépenses (Md€)') if debut <= annee <= fin]
         
         col1, col2 = st.columns(2)
         
         with col1:
             # Évolution recettes/dépenses
             fig = go.Figure()
-            fig.add_trace(go.Scatter(
-                x=hist_df['Année'],
-                y=hist_df['Recettes (Md€)'],
-                mode='lines+markers',
-                name='Recettes',
+            fig.add_trace(make_line_trace(
+                x,
+                hist_df['Recettes (Md€)'],
+                'Recettes',
+                mode='lines' if mensuel else 'lines+markers',
                 line=dict(color='green', width=3)
             ))
-            fig.add_trace(go.Scatter(
-                x=hist_df['Année'],
-                y=hist_df['Dépenses (Md€)'],
-                mode='lines+markers',
-                name='Dépenses',
+            fig.add_trace(make_line_trace(
+                x,
+                hist_df['Dépenses (Md€)'],
+                'Dépenses',
+                mode='lines' if mensuel else 'lines+markers',
                 line=dict(color='red', width=3)
             ))
+            annotate_timeline(fig, evenements, ruptures_depenses, mensuel)
             fig.update_layout(
-                title='Évolution Historique Recettes/Dépenses (2015-2025)',
-                xaxis_title='Année',
-                yaxis_title='Milliards d\'€'
+                title=f'Évolution Historique Recettes/Dépenses ({debut}-{fin})',
+                xaxis_title='Mois' if mensuel else 'Année',
+                yaxis_title='Milliards d\'€ par mois' if mensuel else 'Milliards d\'€'
             )
             st.plotly_chart(fig, use_container_width=True)
         
         with col2:
-            # Évolution dette/déficit
+            # Évolution déficit/dette (en % du PIB : comparable sur longue période)
             fig = make_subplots(specs=[[{"secondary_y": True}]])
             fig.add_trace(
-                go.Scatter(x=hist_df['Année'], y=hist_df['Déficit (Md€)'], name='Déficit'),
+                make_line_trace(x, hist_df['Déficit (Md€)'], 'Déficit'),
                 secondary_y=False,
             )
             fig.add_trace(
-                go.Scatter(x=hist_df['Année'], y=hist_df['Dette (Md€)'], name='Dette'),
+                make_line_trace(x, hist_df['Dette/PIB (%)'], 'Dette/PIB'),
                 secondary_y=True,
             )
-            fig.update_xaxes(title_text="Année")
+            annotate_timeline(fig, evenements, ruptures_dette, mensuel)
+            fig.update_xaxes(title_text='Mois' if mensuel else 'Année')
             fig.update_yaxes(title_text="Déficit (Md€)", secondary_y=False)
-            fig.update_yaxes(title_text="Dette (Md€)", secondary_y=True)
-            fig.update_layout(title_text='Évolution Historique Déficit/Dette (2015-2025)')
+            fig.update_yaxes(title_text="Dette (% PIB)", secondary_y=True)
+            fig.update_layout(title_text=f'Évolution Historique Déficit/Dette ({debut}-{fin})')
             st.plotly_chart(fig, use_container_width=True)
         
         # Analyse des tendances
         st.subheader("Analyse des Tendances et Points d'Inflexion")
         
-        # Identification des événements marquants
-        evenements = {
-            2020: "Crise COVID-19",
-            2022: "Crise énergétique",
-            2023: "Inflation élevée",
-            2025: "Loi de Finance Initiale"
-        }
+        depenses = statistiques.loc['Dépenses (Md€)']
+        recettes = statistiques.loc['Recettes (Md€)']
+        deficit = statistiques.loc['Déficit (Md€)']
+        dette = statistiques.loc['Dette/PIB (%)']
+        inflation = distribution.loc['Inflation (%)']
+        tendances = [
+            f"<li><strong>Dépenses:</strong> {format_variation(depenses['Variation (%)'])} entre {debut} et {fin} "
+            f"(TCAM {format_variation(depenses['TCAM (%)'], '%/an')})</li>",
+            f"<li><strong>Recettes:</strong> {format_variation(recettes['Variation (%)'])} sur la même période "
+            f"(TCAM {format_variation(recettes['TCAM (%)'], '%/an')})</li>",
+            f"<li><strong>Déficit:</strong> {deficit['Début']:.1f} Md€ en début de période, "
+            f"{deficit['Fin']:.1f} Md€ en fin ({deficit['Écart']:+.1f} Md€)</li>",
+            f"<li><strong>Dette/PIB:</strong> de {dette['Début']:.1f}% à {dette['Fin']:.1f}% "
+            f"({dette['Écart']:+.1f} pts, pic à {distribution.loc['Dette/PIB (%)', 'Max']:.1f}%)</li>",
+            f"<li><strong>Inflation:</strong> {inflation['Moyenne']:.1f}% en moyenne, "
+            f"de {inflation['Min']:.1f}% à {inflation['Max']:.1f}%</li>"
+        ]
+        if ruptures_dette:
+            tendances.append(f"<li><strong>Ruptures de tendance de la dette:</strong> "
+                             f"{', '.join(map(str, ruptures_dette))}</li>")
+        
+        if evenements:
+            facteurs = '<ul>' + ''.join(f"<li><strong>{libelle} ({date[:4]})</strong></li>"
+                                        for date, libelle in evenements.items()) + '</ul>'
+        else:
+            facteurs = '<p>Aucun événement marquant sur la période</p>'
         
         col1, col2 = st.columns(2)
         
         with col1:
-            st.markdown("""
-            <div class="budget-card">
-                <h4>Principales Tendances Observées</h4>
-                <ul>
-                    <li><strong>Croissance continue des dépenses:</strong> +29.7% entre 2015 et 2025</li>
-                    <li><strong>Augmentation modérée des recettes:</strong> +25.0% sur la même période</li>
-                    <li><strong>Déficit maîtrisé depuis 2020:</strong> Réduction de 20.4 Md€</li>
-                    <li><strong>Dette stabilisée:</strong> Croissance ralentie depuis 2022</li>
-                </ul>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(render_card('budget-card', 'Principales Tendances Observées',
+                                    f"<ul>{''.join(tendances)}</ul>"), unsafe_allow_html=True)
         
         with col2:
-            st.markdown("""
-            <div class="budget-card">
-                <h4>Facteurs d'Influence</h4>
-                <ul>
-                    <li><strong>COVID-19 (2020):</strong> Hausse massive des dépenses</li>
-                    <li><strong>Crise énergétique (2022):</strong> Impact sur l'inflation</li>
-                    <li><strong>Plan de relance:</strong> Soutien à l'économie</li>
-                    <li><strong>Réformes fiscales:</strong> Optimisation des recettes</li>
-                </ul>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        # Tableau historique
+            st.markdown(render_card('budget-card', "Facteurs d'Influence", facteurs), unsafe_allow_html=True)
+        
+        # Statistiques de la période (niveaux annuels), distribution des observations et tableau historique
+        st.dataframe(statistiques.round(2), use_container_width=True)
+        st.caption("Niveaux de l'année civile : total de l'année pour les flux, moyenne annuelle pour "
+                   "l'inflation, valeur de décembre pour les encours et le ratio Dette/PIB.")
+        st.dataframe(distribution.round(2), use_container_width=True)
+        st.caption("Moyenne et extrema des observations mensuelles (flux en Md€ par mois)." if mensuel
+                   else "Moyenne et extrema des observations annuelles.")
         st.dataframe(hist_df, use_container_width=True)
+        modelise = ["séries antérieures à 2015 reconstituées par interpolation entre points d'ancrage"]
+        if mensuel:
+            modelise.append("ventilation mensuelle modélisée (profil saisonnier bruité des totaux annuels, "
+                            "pas de donnée mensuelle observée)")
+        st.caption(f"⚠️ Données modélisées : {' ; '.join(modelise)}.")
+    
+    def create_territorial_analysis(self):
+        """Finances des collectivités territoriales et concours financiers de l'État"""
+        st.markdown('<h3 class="section-header">🗺️ FINANCES DES COLLECTIVITÉS TERRITORIALES</h3>', 
+                   unsafe_allow_html=True)
+        st.caption("⚠️ Données illustratives : les communes et les EPCI (noms, populations, montants) sont "
+                   "générés synthétiquement, de même que les agrégats départementaux et régionaux qui en "
+                   "découlent, en attendant le branchement d'une source réelle. Seuls les codes et noms "
+                   "des départements et régions sont réels.")
+        
+        # Concours financiers de l'État
+        transferts = get_local_authority_transfers()
+        transferts_df = pd.DataFrame({
+            'Concours': list(transferts.keys()),
+            'Montant (Md€)': list(transferts.values())
+        })
+        rollups = build_territorial_rollups()
+        regions = rollups['regions']
+        departements = rollups['departements']
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            fig = px.pie(transferts_df, values='Montant (Md€)', names='Concours',
+                        title=f"Concours Financiers de l'État ({transferts_df['Montant (Md€)'].sum():.1f} Md€)")
+            st.plotly_chart(fig, use_container_width=True)
+        
+        with col2:
+            st.metric("Communes", f"{departements['Nombre de communes'].sum():,}".replace(',', ' '))
+            st.metric("EPCI", f"{len(rollups['epci']):,}".replace(',', ' '))
+            st.metric("DGF du bloc communal", f"{regions['DGF (M€)'].sum() / 1e3:.1f} Md€")
+        
+        # Filtres territoriaux (sur les agrégats pré-calculés)
+        indicateurs = ['DGF par habitant (€)', 'Dotations par habitant (€)', 'Dette par habitant (€)',
+                       'Fonctionnement par habitant (€)']
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            code_region = st.selectbox(
+                "Région:",
+                options=['Toutes'] + list(regions.index),
+                format_func=lambda code: 'Toutes les régions' if code == 'Toutes' else regions.loc[code, 'Région'],
+                key="territoire_region"
+            )
+        with col2:
+            departements_region = departements if code_region == 'Toutes' else departements[departements['Code région'] == code_region]
+            code_departement = st.selectbox(
+                "Département:",
+                options=['Tous'] + list(departements_region.index),
+                format_func=lambda code: 'Tous les départements' if code == 'Tous' else f"{code} - {departements.loc[code, 'Département']}",
+                key="territoire_departement"
+            )
+        with col3:
+            indicateur = st.selectbox("Indicateur:", options=indicateurs, key="territoire_indicateur")
+        
+        # Agrégats par département, prêts pour une carte choroplèthe (clé : code INSEE)
+        carte_df = departements_region.reset_index()[['Code département', 'Département', 'Région', 'Population', indicateur]]
+        fig = px.treemap(carte_df, path=['Région', 'Département'], values='Population', color=indicateur,
+                        color_continuous_scale='Blues', title=f'{indicateur} par Département')
+        st.plotly_chart(fig, use_container_width=True)
+        
+        if code_departement != 'Tous':
+            # Détail EPCI et communes du département (tranche de la table triée)
+            epci_dep = rollups['epci'][rollups['epci']['Code département'] == code_departement]
+            communes_dep = get_communes_departement(get_territorial_store(), code_departement)
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                fig = px.bar(epci_dep.nlargest(15, 'Population').reset_index(), x=indicateur, y='EPCI',
+                            orientation='h', title=f'{indicateur} par EPCI (15 plus peuplés)')
+                st.plotly_chart(fig, use_container_width=True)
+            with col2:
+                fig = px.histogram(communes_dep, x='Population', nbins=40, log_y=True,
+                                  title=f"Distribution de la Population des {len(communes_dep)} Communes")
+                st.plotly_chart(fig, use_container_width=True)
+            
+            st.subheader(f"Communes - {departements.loc[code_departement, 'Département']}")
+            st.dataframe(communes_dep.nlargest(100, 'Population').round(2), use_container_width=True)
+        else:
+            st.subheader("Agrégats Départementaux")
+            st.dataframe(departements_region.round(1), use_container_width=True)
+        
+        # Recherche par préfixe de nom ou de code INSEE
+        requete = st.text_input("Rechercher une collectivité (nom ou code INSEE):", key="territoire_recherche")
+        if requete:
+            resultats = search_territorial_entities(build_territorial_search_index(), requete)
+            st.dataframe(resultats, use_container_width=True)
+            st.caption("Communes et EPCI synthétiques (données illustratives).")
     
     def create_recommendations(self):
         """Génère des recommandations stratégiques"""
@@ -808,29 +2333,37 @@ class LoiFinanceDashboard:
         show_details = st.sidebar.checkbox("Afficher les détails techniques", value=False)
         show_projections = st.sidebar.checkbox("Afficher les projections", value=True)
         
-        # Export des données
-        st.sidebar.markdown("### 📥 EXPORT")
+        # État des sources macroéconomiques
+        st.sidebar.markdown("### 🔌 SOURCES")
+        sources = load_macro_inputs()
+        for nom, statut in sources['statuts'].items():
+            st.sidebar.caption(f"{nom}: {statut}")
+        st.sidebar.caption(f"Actualisation: {sources['duree']:.2f} s")
         
-        # Récupérer le scénario actuel depuis session_state
-        current_scenario = st.session_state.scenario_selected
-        
-        if st.sidebar.button("Exporter les données en CSV"):
-            # Génération du CSV
-            projections = generate_projections(self.budget_data, self.inflation_data, current_scenario)
-            projections_df = pd.DataFrame({
-                'Année': projections['annees'],
-                'Recettes (Md€)': projections['recettes'],
-                'Dépenses (Md€)': projections['depenses'],
-                'Déficit (Md€)': projections['deficit'],
-                'Dette (Md€)': projections['dette']
-            })
-            csv = projections_df.to_csv(index=False)
-            st.sidebar.download_button(
-                label="Télécharger CSV",
-                data=csv,
-                file_name=f"budget_projections_{current_scenario}_{datetime.now().strftime('%Y%m%d')}.csv",
-                mime="text/csv"
-            )
+        if st.sidebar.button("Actualiser les sources"):
+            load_macro_inputs.clear()
+            get_budget_data_2025.clear()
+            get_inflation_projections.clear()
+            st.rerun()
+        
+        # Export des données : tous les scénarios, lignes détaillées et historique
+        st.sidebar.markdown("### 📥 EXPORT")
+        format_export = st.sidebar.selectbox("Format d'export", list(EXPORT_FORMATS), key="export_format")
+        version = export_version(self.budget_data, self.inflation_data, self.vintages)
+        
+        # Lot construit au clic (une seule fois par version), sans réexécution de la page
+        st.sidebar.download_button(
+            label="Exporter toutes les données",
+            data=lambda: build_export_bundle(
+                version, format_export,
+                lambda: build_export_tables(self.budget_data, self.inflation_data, self.vintages)
+            ),
+            file_name=f"lfi2025_{version}.{EXPORT_FORMATS[format_export]['extension']}",
+            mime=EXPORT_FORMATS[format_export]['mime'],
+            key="export_bundle",
+            on_click='ignore'
+        )
+        st.sidebar.caption(f"Version des données: {version}")
         
         return {
             'show_details': show_details,
@@ -839,6 +2372,9 @@ class LoiFinanceDashboard:
     
     def run_dashboard(self):
         """Exécute le dashboard complet"""
+        # Suivi des éléments envoyés au navigateur
+        render_stats = install_render_stats()
+        
         # Sidebar
         controls = self.create_sidebar()
         
@@ -849,8 +2385,9 @@ class LoiFinanceDashboard:
         self.display_kpi_overview()
         
         # Navigation par onglets
-        tab1, tab2, tab3, tab4, tab5 = st.tabs([
+        tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
             "📊 Structure Budgétaire", 
+            "🗺️ Collectivités Territoriales",
             "📈 Analyse Inflation", 
             "🔮 Scénarios Prospectifs",
             "📊 Analyse Historique",
@@ -861,15 +2398,18 @@ class LoiFinanceDashboard:
             self.create_budget_structure()
         
         with tab2:
-            self.create_inflation_analysis()
+            self.create_territorial_analysis()
         
         with tab3:
-            self.create_scenario_analysis()
+            self.create_inflation_analysis()
         
         with tab4:
-            self.create_historical_analysis()
+            self.create_scenario_analysis()
         
         with tab5:
+            self.create_historical_analysis()
+        
+        with tab6:
             self.create_recommendations()
         
         # Footer
@@ -881,6 +2421,13 @@ class LoiFinanceDashboard:
             © Direction Générale des Finances Publiques
         </div>
         """, unsafe_allow_html=True)
+        
+        # Bilan de rendu de la réexécution
+        if render_stats is None:
+            st.sidebar.caption("📡 Rendu: n.d.")
+        else:
+            st.sidebar.caption(f"📡 Rendu: {render_stats['elements']} éléments, "
+                               f"{render_stats['octets'] / 1024:.1f} Ko envoyés")
 
 # Lancement du dashboard
 if __name__ == "__main__":
@@ -0,0 +1,376 @@
+# load_test.py
+"""Test de charge du dashboard : N sessions simultanées sur le websocket Streamlit.
+
+Chaque session simulée change de scénario (scenario_selector), bascule une option
+de la sidebar et clique sur l'export (CSV zip), comme le ferait un navigateur. Le script
+rapporte les latences de réexécution p50/p95/p99, le CPU et la mémoire (RSS) du
+serveur pour chaque nombre de sessions.
+
+Usage :
+    python load_test.py --sessions 1,5,10,25 --iterations 5
+    python load_test.py --url http://127.0.0.1:8501 --pid 12345   # serveur déjà lancé
+"""
+import argparse
+import asyncio
+import csv
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import aiohttp
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+try:
+    import psutil
+except ImportError:  # mesures serveur indisponibles sans psutil
+    psutil = None
+
+OPTIONS_SIDEBAR = ["Afficher les détails techniques", "Afficher les projections"]
+BOUTON_EXPORT = "Exporter toutes les données"
+FORMAT_EXPORT = "CSV (zip)"
+
+
+class SimulatedSession:
+    """Session navigateur simulée : rejoue le protocole BackMsg/ForwardMsg"""
+
+    def __init__(self, http, base_url):
+        self.http = http
+        self.base_url = base_url.rstrip('/')
+        self.ws = None
+        self.session_id = ''
+        self.widgets = {}  # id -> élément reçu lors de la dernière exécution
+        self.etats = {}    # id -> WidgetState renvoyé à chaque réexécution
+        self.chargement = None
+        self.latences = []
+        self.exports = []
+        self.erreurs = 0
+
+    async def connect(self):
+        url = self.base_url.replace('http', 'ws', 1) + '/_stcore/stream'
+        self.ws = await self.http.ws_connect(url, protocols=('streamlit',), max_msg_size=0)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def rerun(self, declencheurs=()):
+        """Envoie une réexécution et attend la fin du script ; renvoie la durée en secondes"""
+        message = BackMsg()
+        message.rerun_script.query_string = ''
+        message.rerun_script.page_script_hash = ''
+        message.rerun_script.widget_states.widgets.extend([*self.etats.values(), *declencheurs])
+
+        debut = time.perf_counter()
+        await self.ws.send_bytes(message.SerializeToString())
+        while True:
+            msg = await self._recevoir()
+            type_msg = msg.WhichOneof('type')
+            if type_msg == 'new_session' and msg.new_session.initialize.session_id:
+                self.session_id = msg.new_session.initialize.session_id
+            elif type_msg == 'delta' and msg.delta.WhichOneof('type') == 'new_element':
+                self._enregistrer_element(msg.delta.new_element)
+            elif type_msg == 'script_finished':
+                # Une exécution interrompue par la suivante n'est pas la fin de la requête
+                if msg.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                if msg.script_finished != ForwardMsg.FINISHED_SUCCESSFULLY:
+                    self.erreurs += 1
+                return time.perf_counter() - debut
+
+    async def _recevoir(self):
+        reponse = await self.ws.receive()
+        if reponse.type != aiohttp.WSMsgType.BINARY:
+            raise ConnectionError(f"Websocket fermé par le serveur ({reponse.type.name})")
+        msg = ForwardMsg()
+        msg.ParseFromString(reponse.data)
+        return msg
+
+    def _enregistrer_element(self, element):
+        type_element = element.WhichOneof('type')
+        if type_element == 'exception':
+            self.erreurs += 1
+            return
+        proto = getattr(element, type_element)
+        identifiant = getattr(proto, 'id', '')
+        if identifiant:
+            self.widgets[identifiant] = proto
+
+    def widget(self, cle=None, libelle=None):
+        """Retrouve un widget par sa clé (suffixe de l'id) ou par son libellé"""
+        for identifiant, proto in self.widgets.items():
+            if (cle and identifiant.endswith(f'-{cle}')) or (libelle and getattr(proto, 'label', None) == libelle):
+                return identifiant, proto
+        raise KeyError(f"Widget introuvable : {cle or libelle}")
+
+    def choisir_option(self, cle, rng=None, valeur=None):
+        identifiant, proto = self.widget(cle=cle)
+        valeur = valeur if valeur is not None else rng.choice(list(proto.options))
+        self.etats[identifiant] = WidgetState(id=identifiant, string_value=valeur)
+
+    def basculer_option(self, libelle):
+        identifiant, proto = self.widget(libelle=libelle)
+        actuel = self.etats[identifiant].bool_value if identifiant in self.etats else proto.default
+        self.etats[identifiant] = WidgetState(id=identifiant, bool_value=not actuel)
+
+    async def exporter(self):
+        """Clique sur l'export : génération différée côté serveur, puis téléchargement du fichier"""
+        _, proto = self.widget(libelle=BOUTON_EXPORT)
+        message = BackMsg()
+        requete = message.backend_operation_request
+        requete.request_id = uuid.uuid4().hex
+        requete.session_id = self.session_id
+        requete.deferred_file.file_id = proto.deferred_file_id
+
+        debut = time.perf_counter()
+        await self.ws.send_bytes(message.SerializeToString())
+        while True:
+            msg = await self._recevoir()
+            if (msg.WhichOneof('type') == 'backend_operation_response'
+                    and msg.backend_operation_response.request_id == requete.request_id):
+                break
+        reponse = msg.backend_operation_response
+        if reponse.error_msg:
+            self.erreurs += 1
+            return
+        async with self.http.get(self.base_url + reponse.deferred_file.url) as fichier:
+            await fichier.read()
+            if fichier.status != 200:
+                self.erreurs += 1
+        self.exports.append(time.perf_counter() - debut)
+
+    async def parcours(self, iterations, rng):
+        """Parcours type d'un lecteur : scénario, option, export"""
+        await self.connect()
+        try:
+            self.chargement = await self.rerun()
+            self.choisir_option('export_format', valeur=FORMAT_EXPORT)
+            for _ in range(iterations):
+                self.choisir_option('scenario_selector', rng)
+                self.latences.append(await self.rerun())
+
+                self.basculer_option(rng.choice(OPTIONS_SIDEBAR))
+                self.latences.append(await self.rerun())
+
+                # Le bouton d'export ne relance pas le script
+                await self.exporter()
+
+                # Temps de lecture entre deux interactions
+                await asyncio.sleep(rng.uniform(0, 0.5))
+        finally:
+            await self.close()
+
+
+class ServerMonitor:
+    """Échantillonne le CPU et la mémoire (RSS) du processus serveur"""
+
+    def __init__(self, pid, intervalle=0.1):
+        self.processus = psutil.Process(pid) if psutil is not None and pid else None
+        self.intervalle = intervalle
+        self.tache = None
+
+    def _mesurer(self):
+        try:
+            processus = [self.processus, *self.processus.children(recursive=True)]
+        except psutil.Error:
+            processus = [self.processus]
+        cpu, rss = 0.0, 0
+        for p in processus:
+            # Un processus fils peut se terminer entre l'énumération et la mesure
+            try:
+                with p.oneshot():
+                    cpu += sum(p.cpu_times()[:2])
+                    rss += p.memory_info().rss
+            except psutil.Error:
+                continue
+        return cpu, rss
+
+    def rss(self):
+        return self._mesurer()[1] if self.processus is not None else None
+
+    async def _echantillonner(self):
+        while True:
+            self.rss_max = max(self.rss_max, self._mesurer()[1])
+            await asyncio.sleep(self.intervalle)
+
+    def start(self):
+        if self.processus is None:
+            return
+        self.cpu_debut, self.rss_max = self._mesurer()
+        self.debut = time.perf_counter()
+        self.tache = asyncio.create_task(self._echantillonner())
+
+    async def stop(self):
+        """Renvoie (CPU moyen en %, RSS maximal en octets) sur la période mesurée"""
+        if self.tache is None:
+            return None, None
+        self.tache.cancel()
+        try:
+            await self.tache
+        except asyncio.CancelledError:
+            pass
+        self.tache = None
+        cpu, rss = self._mesurer()
+        duree = time.perf_counter() - self.debut
+        return 100 * (cpu - self.cpu_debut) / duree, max(self.rss_max, rss)
+
+
+async def run_stage(base_url, n_sessions, iterations, monitor, rss_repos, graine):
+    """Lance n_sessions parcours simultanés et agrège les mesures"""
+    connecteur = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connecteur) as http:
+        sessions = [SimulatedSession(http, base_url) for _ in range(n_sessions)]
+        monitor.start()
+        debut = time.perf_counter()
+        resultats = await asyncio.gather(
+            *(session.parcours(iterations, random.Random(graine + i)) for i, session in enumerate(sessions)),
+            return_exceptions=True
+        )
+        duree = time.perf_counter() - debut
+        cpu, rss = await monitor.stop()
+
+    latences = np.array([latence for session in sessions for latence in session.latences]) * 1000
+    chargements = np.array([session.chargement for session in sessions if session.chargement is not None]) * 1000
+    exports = np.array([export for session in sessions for export in session.exports]) * 1000
+    echecs = [resultat for resultat in resultats if isinstance(resultat, BaseException)]
+    p50, p95, p99 = np.percentile(latences, [50, 95, 99]) if latences.size else (np.nan,) * 3
+
+    return {
+        'sessions': n_sessions,
+        'réexécutions': int(latences.size),
+        'débit (réexéc/s)': latences.size / duree,
+        'chargement p50 (ms)': float(np.median(chargements)) if chargements.size else np.nan,
+        'p50 (ms)': p50,
+        'p95 (ms)': p95,
+        'p99 (ms)': p99,
+        'export p50 (ms)': float(np.median(exports)) if exports.size else np.nan,
+        'CPU (%)': cpu,
+        'RSS (Mo)': rss / 2**20 if rss is not None else None,
+        'RSS/session (Mo)': (rss - rss_repos) / 2**20 / n_sessions if rss is not None and rss_repos else None,
+        'erreurs': len(echecs) + sum(session.erreurs for session in sessions),
+        'exemple_erreur': repr(echecs[0]) if echecs else ''
+    }
+
+
+def port_libre():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def attendre_serveur(base_url, delai=60):
+    """Attend que le serveur réponde sur son point de santé"""
+    limite = time.perf_counter() + delai
+    async with aiohttp.ClientSession() as http:
+        while time.perf_counter() < limite:
+            try:
+                async with http.get(f'{base_url}/_stcore/health') as reponse:
+                    if reponse.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    raise TimeoutError(f"Le serveur {base_url} ne répond pas après {delai} s")
+
+
+def demarrer_serveur(port):
+    """Lance le dashboard en mode headless dans un sous-processus"""
+    commande = [
+        sys.executable, '-m', 'streamlit', 'run', str(Path(__file__).with_name('Dash.py')),
+        '--server.headless', 'true',
+        '--server.port', str(port),
+        '--browser.gatherUsageStats', 'false'
+    ]
+    return subprocess.Popen(commande, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def format_valeur(valeur, decimales=0):
+    if valeur is None or (isinstance(valeur, float) and np.isnan(valeur)):
+        return 'n.d.'
+    return f'{valeur:.{decimales}f}' if isinstance(valeur, float) else str(valeur)
+
+
+def afficher_rapport(lignes):
+    colonnes = [
+        ('sessions', 0), ('réexécutions', 0), ('débit (réexéc/s)', 1), ('chargement p50 (ms)', 0),
+        ('p50 (ms)', 0), ('p95 (ms)', 0), ('p99 (ms)', 0), ('export p50 (ms)', 0),
+        ('CPU (%)', 0), ('RSS (Mo)', 0), ('RSS/session (Mo)', 1), ('erreurs', 0)
+    ]
+    tableau = [[nom for nom, _ in colonnes]]
+    tableau += [[format_valeur(ligne[nom], decimales) for nom, decimales in colonnes] for ligne in lignes]
+    largeurs = [max(len(ligne[i]) for ligne in tableau) for i in range(len(colonnes))]
+    for i, ligne in enumerate(tableau):
+        print('  '.join(cellule.rjust(largeur) for cellule, largeur in zip(ligne, largeurs)))
+        if i == 0:
+            print('  '.join('-' * largeur for largeur in largeurs))
+    for ligne in lignes:
+        if ligne['exemple_erreur']:
+            print(f"[{ligne['sessions']} sessions] {ligne['exemple_erreur']}")
+
+
+async def main(args):
+    processus = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+        pid = args.pid
+    else:
+        port = args.port or port_libre()
+        base_url = f'http://127.0.0.1:{port}'
+        processus = demarrer_serveur(port)
+        pid = processus.pid
+
+    try:
+        await attendre_serveur(base_url)
+        monitor = ServerMonitor(pid)
+        if monitor.processus is None:
+            print("psutil absent ou PID inconnu : CPU et RSS non mesurés")
+
+        # Une session de chauffe remplit les caches st.cache_data avant les mesures
+        await run_stage(base_url, 1, 1, ServerMonitor(None), None, args.graine)
+        rss_repos = monitor.rss()
+
+        lignes = []
+        for n_sessions in args.sessions:
+            print(f"→ {n_sessions} session(s) × {args.iterations} itération(s)...", flush=True)
+            lignes.append(await run_stage(base_url, n_sessions, args.iterations, monitor, rss_repos, args.graine))
+            # Laisse le serveur libérer les sessions fermées avant le palier suivant
+            await asyncio.sleep(args.pause)
+
+        print()
+        afficher_rapport(lignes)
+        if args.csv:
+            with open(args.csv, 'w', newline='', encoding='utf-8') as fichier:
+                writer = csv.DictWriter(fichier, fieldnames=list(lignes[0]))
+                writer.writeheader()
+                writer.writerows(lignes)
+        return 1 if any(ligne['erreurs'] for ligne in lignes) else 0
+    finally:
+        if processus is not None:
+            processus.terminate()
+            processus.wait(timeout=10)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge du dashboard Loi de Finance (sessions simultanées)")
+    parser.add_argument('--sessions', default='1,5,10,25',
+                        type=lambda valeur: [int(n) for n in valeur.split(',')],
+                        help="Nombres de sessions simultanées à tester, séparés par des virgules")
+    parser.add_argument('--iterations', type=int, default=5,
+                        help="Nombre de parcours (scénario, option, export) par session")
+    parser.add_argument('--url', help="URL d'un serveur déjà lancé (sinon Dash.py est démarré localement)")
+    parser.add_argument('--pid', type=int, help="PID du serveur déjà lancé, pour mesurer CPU et RSS")
+    parser.add_argument('--port', type=int, help="Port du serveur démarré localement")
+    parser.add_argument('--pause', type=float, default=2.0, help="Pause entre deux paliers (s)")
+    parser.add_argument('--graine', type=int, default=2025, help="Graine des choix aléatoires")
+    parser.add_argument('--csv', help="Fichier CSV où enregistrer le rapport")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main(parse_args())))
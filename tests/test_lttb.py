@@ -0,0 +1,103 @@
+"""Sous-échantillonnage LTTB et pyramide multi-résolution des graphiques.
+
+    python -m unittest discover tests
+"""
+import importlib.util
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RACINE = Path(__file__).resolve().parents[1]
+
+
+def charger_dashboard():
+    spec = importlib.util.spec_from_file_location('Dash', RACINE / 'Dash.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+Dash = charger_dashboard()
+
+
+class TestLttbIndices(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.x = np.arange(10000, dtype=float)
+        self.y = np.cumsum(rng.normal(0, 1, len(self.x)))
+
+    def test_un_point_par_seau(self):
+        n_points = 500
+        indices = Dash.lttb_indices(self.x, self.y, n_points)
+        bornes = np.linspace(1, len(self.x) - 1, n_points - 1).astype(int)
+
+        self.assertEqual(len(indices), n_points)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        # Chaque point intermédiaire appartient à son seau
+        for i, indice in enumerate(indices[1:-1]):
+            self.assertGreaterEqual(indice, bornes[i])
+            self.assertLess(indice, bornes[i + 1])
+
+    def test_premier_et_dernier_points_conserves(self):
+        indices = Dash.lttb_indices(self.x, self.y, 100)
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices[-1], len(self.x) - 1)
+
+    def test_pic_conserve(self):
+        y = np.zeros(len(self.x))
+        y[4321] = 1000.0
+        y[7654] = -1000.0
+        indices = Dash.lttb_indices(self.x, y, 50)
+        self.assertIn(4321, indices)
+        self.assertIn(7654, indices)
+
+    def test_serie_courte_inchangee(self):
+        np.testing.assert_array_equal(Dash.lttb_indices(self.x[:10], self.y[:10], 50), np.arange(10))
+        np.testing.assert_array_equal(Dash.lttb_indices(self.x, self.y, 2), np.arange(len(self.x)))
+
+    def test_axe_de_dates(self):
+        dates = pd.date_range('1958-01-01', periods=len(self.x), freq='D').to_numpy()
+        np.testing.assert_array_equal(Dash.lttb_indices(dates, self.y, 200),
+                                      Dash.lttb_indices(self.x, self.y, 200))
+
+
+class TestPyramideLttb(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.x = np.arange(200000, dtype=float)
+        self.y = np.cumsum(rng.normal(0, 1, len(self.x)))
+        self.y[123456] += 5000.0
+        self.niveaux = Dash.build_lttb_pyramid(self.x, self.y, resolution=1000, facteur=4, points_max=16000)
+
+    def test_niveaux_croissants_puis_serie_complete(self):
+        tailles = [len(x) for x, _ in self.niveaux]
+        self.assertEqual(tailles, [1000, 4000, 16000, len(self.x)])
+        np.testing.assert_array_equal(self.niveaux[-1][0], self.x)
+
+    def test_vue_complete(self):
+        x, y = Dash.query_lttb_pyramid(self.niveaux, resolution=1000)
+        self.assertEqual(len(x), 1000)
+        self.assertEqual((x[0], x[-1]), (self.x[0], self.x[-1]))
+        self.assertIn(123456.0, x)
+
+    def test_fenetre_zoomee(self):
+        for x_range in ((50000, 60000), (123000, 124000), (199500, 200000)):
+            x, y = Dash.query_lttb_pyramid(self.niveaux, x_range, resolution=500)
+            self.assertLessEqual(len(x), 500)
+            self.assertTrue(np.all((x >= x_range[0]) & (x <= x_range[1])))
+            self.assertTrue(np.all(np.diff(x) > 0))
+            # Les valeurs restent celles de la série d'origine
+            np.testing.assert_array_equal(y, self.y[x.astype(int)])
+        self.assertIn(123456.0, Dash.query_lttb_pyramid(self.niveaux, (123000, 124000), resolution=500)[0])
+
+    def test_fenetre_fine_servie_depuis_la_serie_complete(self):
+        x, _ = Dash.query_lttb_pyramid(self.niveaux, (1000, 1099), resolution=500)
+        np.testing.assert_array_equal(x, self.x[1000:1100])
+
+
+if __name__ == '__main__':
+    unittest.main()
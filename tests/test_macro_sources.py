@@ -0,0 +1,149 @@
+"""Chargement des sources macroéconomiques contre un miroir HTTP local (aiohttp).
+
+    python -m unittest discover tests
+"""
+import asyncio
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from aiohttp import web
+
+RACINE = Path(__file__).resolve().parents[1]
+MIROIRS = ('LFI_MIRROR_INSEE', 'LFI_MIRROR_EUROSTAT', 'LFI_MIRROR_BDF')
+
+
+def charger_dashboard():
+    spec = importlib.util.spec_from_file_location('Dash', RACINE / 'Dash.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+Dash = charger_dashboard()
+
+
+class MiroirLocal:
+    """Miroir de test : réponse et délai configurables par chemin"""
+
+    def __init__(self):
+        self.reponses = {source['chemin']: {'valeur': 1.0} for source in Dash.MACRO_SOURCES.values()}
+        self.reponses['/hicp/france/categories'] = {'valeur': {'Énergie': 3.1, 'Alimentation': 2.2}}
+        self.delais = {chemin: 0.0 for chemin in self.reponses}
+        self.boucle = asyncio.new_event_loop()
+        self.pret = threading.Event()
+        self.thread = threading.Thread(target=self._servir, daemon=True)
+
+    async def _repondre(self, requete):
+        await asyncio.sleep(self.delais[requete.path])
+        return web.json_response(self.reponses[requete.path])
+
+    def _servir(self):
+        asyncio.set_event_loop(self.boucle)
+        application = web.Application()
+        for chemin in self.reponses:
+            application.router.add_get(chemin, self._repondre)
+        self.runner = web.AppRunner(application)
+        self.boucle.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        self.boucle.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.pret.set()
+        self.boucle.run_forever()
+
+    def demarrer(self):
+        self.thread.start()
+        self.pret.wait(10)
+        return f'http://127.0.0.1:{self.port}'
+
+    def arreter(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.boucle).result(10)
+        self.boucle.call_soon_threadsafe(self.boucle.stop)
+        self.thread.join(10)
+        self.boucle.close()
+
+
+class TestMacroSources(unittest.TestCase):
+
+    def setUp(self):
+        self.miroir = MiroirLocal()
+        url = self.miroir.demarrer()
+        self.environnement = {nom: os.environ.get(nom) for nom in MIROIRS}
+        for nom in MIROIRS:
+            os.environ[nom] = url
+        self.instantanes = tempfile.TemporaryDirectory()
+        self.snapshot_dir = Dash.SNAPSHOT_DIR
+        Dash.SNAPSHOT_DIR = Path(self.instantanes.name)
+        Dash.load_macro_inputs.clear()
+
+    def tearDown(self):
+        Dash.load_macro_inputs.clear()
+        Dash.SNAPSHOT_DIR = self.snapshot_dir
+        self.instantanes.cleanup()
+        for nom, valeur in self.environnement.items():
+            if valeur is None:
+                os.environ.pop(nom, None)
+            else:
+                os.environ[nom] = valeur
+        self.miroir.arreter()
+
+    def charger(self, timeout=5.0):
+        Dash.load_macro_inputs.clear()
+        return Dash.load_macro_inputs(timeout=timeout)
+
+    def test_sources_chargees_en_parallele(self):
+        for chemin in self.miroir.delais:
+            self.miroir.delais[chemin] = 0.3
+        self.miroir.delais['/hicp/france/categories'] = 0.6
+
+        debut = time.perf_counter()
+        resultat = self.charger()
+        duree = time.perf_counter() - debut
+
+        self.assertEqual(set(resultat['statuts'].values()), {'En direct'})
+        # Durée ≈ source la plus lente (0.6 s), loin de la somme des délais (1.5 s)
+        self.assertGreaterEqual(duree, 0.6)
+        self.assertLess(duree, 1.2)
+
+    def test_expiration_repli_sur_instantane(self):
+        self.miroir.reponses['/projections/inflation'] = {'valeur': 1.9}
+        self.assertEqual(self.charger()['valeurs']['inflation_prevue'], 1.9)
+
+        self.miroir.reponses['/projections/inflation'] = {'valeur': 4.0}
+        self.miroir.delais['/projections/inflation'] = 2.0
+        resultat = self.charger(timeout=0.5)
+
+        self.assertTrue(resultat['statuts']['inflation_prevue'].startswith('Instantané du'))
+        self.assertEqual(resultat['valeurs']['inflation_prevue'], 1.9)
+        self.assertEqual(resultat['statuts']['croissance_pib'], 'En direct')
+        self.assertLess(resultat['duree'], 1.5)
+
+    def test_reponse_mal_formee_rejetee(self):
+        # Scalaire à la place des catégories, catégories à la place d'un scalaire, texte
+        self.miroir.reponses['/hicp/france/categories'] = {'valeur': 2.5}
+        self.miroir.reponses['/projections/inflation'] = {'valeur': {'Total': 2.0}}
+        self.miroir.reponses['/emploi/chomage/taux'] = {'valeur': '7,4'}
+        resultat = self.charger()
+
+        for nom in ('inflation_categories', 'inflation_prevue', 'taux_chômage'):
+            self.assertEqual(resultat['statuts'][nom], 'Valeur par défaut')
+            self.assertNotIn(nom, resultat['valeurs'])
+            self.assertFalse((Dash.SNAPSHOT_DIR / f'{nom}.json').exists())
+        self.assertEqual(resultat['statuts']['croissance_pib'], 'En direct')
+
+    def test_instantane_mal_forme_ignore(self):
+        Dash.SNAPSHOT_DIR.joinpath('inflation_categories.json').write_text(
+            json.dumps({'valeur': 2.5, 'horodatage': '2025-01-01T00:00:00'}), encoding='utf-8')
+        self.miroir.reponses['/hicp/france/categories'] = {'valeur': 2.5}
+        resultat = self.charger()
+
+        self.assertEqual(resultat['statuts']['inflation_categories'], 'Valeur par défaut')
+
+
+if __name__ == '__main__':
+    unittest.main()